@@ -9,9 +9,10 @@ setup(
     version="1.0.0",
     packages=find_packages(),
     install_requires=[
-        "requests>=2.28.0",
+        "httpx[http2]>=0.24.0",
+        "orjson>=3.9.0",
         "python-docx>=0.8.11",
-        "PyPDF2>=3.0.0",
+        "pypdf>=3.9.0",
         "spacy>=3.5.0",
         "cryptography>=39.0.0",
         "python-dotenv>=1.0.0",
@@ -6,20 +6,218 @@ while ensuring no PHI is transmitted.
 """
 
 import os
+import io
+import re
+import itertools
 import json
-import requests
+import gzip
+import hashlib
+import sqlite3
+import httpx
 import time
+import math
+import random
+from datetime import datetime
 from pathlib import Path
 import threading
+import functools
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+from src.config import load_config
+
+# Fast JSON serialization when orjson is available
+try:
+    import orjson
+    ORJSON_SUPPORT = True
+except ImportError:
+    ORJSON_SUPPORT = False
+
+# HTTP/2 support requires the optional h2 package
+try:
+    import h2  # noqa: F401
+    HTTP2_SUPPORT = True
+except ImportError:
+    HTTP2_SUPPORT = False
+
+# Request bodies at least this large are gzip-compressed before sending
+GZIP_MIN_BYTES = 2048
+
+# Directory holding cached API responses
+CACHE_DIR = Path(__file__).parent.parent.parent / "cache"
+# Marker file identifying a cache directory in the current (SQLite) format
+CACHE_FORMAT_MARKER = ".sqlite-v1"
+# Single-file store holding all cached responses
+CACHE_DB_NAME = "cache.sqlite"
+
+# Sections currently being processed, keyed by content id. Each entry is an
+# event that is set once processing finishes.
+_inflight = {}
+# Guards access to _inflight
+_inflight_lock = threading.Lock()
+
+# Break points used when splitting large sections: paragraph breaks, then
+# sentence ends and single line breaks
+_CHUNK_BOUNDARY_RE = re.compile(r'\n{2,}|(?<=[.!?])[ \t]+|\n')
+# Runs of three or more newlines, collapsed when combining chunks
+_BLANK_LINES_RE = re.compile(r'\n{3,}')
+
+# Section-specific guidance appended to the system instructions
+SECTION_GUIDANCE = {
+    "case_synopsis": "Provide a concise overview of the client's situation, reason for referral, and general assessment purpose. Focus on clarity and context.",
+    "background_information": "Organize relevant history chronologically. Highlight key events that impact current function. Include relevant personal, medical, and vocational history.",
+    "assessment_methodology": "Detail evaluation methods with specific tests performed and standardized measures. Describe the assessment environment and any adaptations made.",
+    "functional_observations": "Present objective findings in clear categories (physical, cognitive, emotional). Link observations to functional impact and daily activities.",
+    "activities_of_daily_living": "Structure by activity type (self-care, instrumental ADLs, etc.). For each activity, describe current ability, limitations, and adaptations.",
+    "social_functioning": "Describe interpersonal capabilities, community integration, and support systems. Note changes from pre-injury/illness baseline if mentioned.",
+    "concentration_persistence_pace": "Detail attentional capacity, task sustainability, and work rhythm. Include specific examples of performance limitations and strengths.",
+    "adaptability_work_settings": "Analyze ability to adapt to various environments and respond to workplace demands. Note specific accommodations that may be beneficial.",
+    "summary_recommendations": "Synthesize key findings and provide clear, specific recommendations tied directly to assessment results. Prioritize recommendations by importance."
+}
+
+# Guidance used for sections without a specific entry
+DEFAULT_SECTION_GUIDANCE = "Organize content logically and enhance clarity while maintaining all clinical information."
+
+# Section instructions, built once per section at import time
+_SECTION_INSTRUCTIONS = """
+3. NARRATIVE STRUCTURE:
+   - Create smooth transitions between paragraphs
+   - Use appropriate headings and subheadings for organization
+   - Maintain a logical flow from observations to clinical interpretations
+   - Present information in order of clinical relevance
+
+4. CONTENT REQUIREMENTS:
+   - Preserve all factual information and clinical data from the original
+   - Do not introduce new medical facts, diagnoses, or clinical interpretations
+   - When describing functional limitations, clearly connect them to activities of daily living
+   - For assessments, clearly differentiate between objective findings and clinical impressions
+
+5. STYLE AND TONE:
+   - Maintain objective, evidence-based language
+   - Use active voice where appropriate
+   - Avoid redundancy and unnecessary repetition
+   - Eliminate vague or ambiguous statements
+   - Ensure statements are supported by the information provided
+
+6. SECTION-SPECIFIC GUIDANCE:
+{guidance}
+"""
+_SECTION_SYSTEM_TEXT = {
+    name: _SECTION_INSTRUCTIONS.format(guidance=guidance)
+    for name, guidance in SECTION_GUIDANCE.items()
+}
+_DEFAULT_SECTION_SYSTEM_TEXT = _SECTION_INSTRUCTIONS.format(guidance=DEFAULT_SECTION_GUIDANCE)
+
+# Instructions for batched requests covering several sections at once
+_BATCH_SYSTEM_TEXT = _SECTION_INSTRUCTIONS.format(
+    guidance="Follow the guidance given with each section in the request."
+) + """
+7. OUTPUT FORMAT:
+   - Respond with a single JSON object and nothing else
+   - Use exactly the section ids given in the request as keys
+   - Each value is the rewritten section as a string
+   - The response must match this JSON schema: {"type": "object", "additionalProperties": {"type": "string"}}
+"""
+
+# Instructions for chunk requests, identical for every chunk
+_CHUNK_SYSTEM_TEXT = """
+3. CONTENT INTEGRITY: 
+   - Enhance only this chunk - don't worry about connections to other chunks
+   - Maintain all clinical facts and information from the original
+   - Do not introduce new medical facts or diagnoses
+   - If a sentence is cut off, finish it naturally based on context
+
+4. STYLE AND TONE:
+   - Maintain objective, evidence-based language
+   - Use active voice where appropriate
+   - Eliminate redundancy and vague statements
+   - Ensure statements are supported by the information provided
+"""
+
+# User message templates, filled in with str.format
+_PROMPT_TEMPLATE = """
+Your task is to enhance the following {formatted_section} section of a clinical report.
+
+## ORIGINAL CONTENT TO ENHANCE:
+
+{content}
+
+## TASK:
+
+Please rewrite the {formatted_section} section, adhering to all guidelines provided. Your response should be a cohesive, well-structured narrative ready to be integrated into a professional clinical report. Maintain all clinical accuracy while improving readability and professional quality.
+"""
+
+_CHUNK_PROMPT_TEMPLATE = """
+You are enhancing a {formatted_section} section that has been split into {total_chunks} parts due to length. This is part {chunk_num} of {total_chunks}.
+
+## ORIGINAL CHUNK {chunk_num}/{total_chunks} TO ENHANCE:
+
+{chunk}
+
+## TASK:
+
+Provide an enhanced version of this chunk. Your response should improve clinical readability while maintaining all facts and placeholders exactly.
+"""
+
+def log_calls(start, done=None, failed=None):
+    """
+    Decorator that reports a method call through the client's on_event hook.
+    
+    Templates are formatted with the call's arguments by name, plus `title`
+    (the section name in title case) for methods taking a section_name.
+    When no hook is set the method is called directly.
+    
+    Args:
+        start: Message sent before the call
+        done: Message sent after a call that returned a truthy result
+        failed: Message sent after a call that returned a falsy result;
+            defaults to done
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+        
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            on_event = self.on_event
+            if on_event is None:
+                return method(self, *args, **kwargs)
+            
+            fields = signature.bind(self, *args, **kwargs).arguments
+            if "section_name" in fields:
+                fields["title"] = fields["section_name"].replace('_', ' ').title()
+            
+            on_event(start.format(**fields))
+            result = method(self, *args, **kwargs)
+            message = done if result or failed is None else failed
+            if message:
+                on_event(message.format(**fields))
+            return result
+        return wrapper
+    return decorator
 
-# Global lock for section processing
-section_locks = {}
-# Global set to track sections being processed
-processing_sections = set()
 
 class ClaudeAPIClient:
     """Client for interacting with Claude API to enhance clinical report narratives."""
     
+    # Optional callable(message) notified of API activity, e.g. the web UI's
+    # activity console
+    on_event = None
+    
+    # Earliest time any client may send its next request after a 429,
+    # shared so that all workers back off together
+    _global_not_before = 0.0
+    _global_lock = threading.Lock()
+    
+    # Instructions shared by every request. This must stay byte-identical
+    # between calls for the API prompt cache to be hit.
+    STATIC_SYSTEM = """You are an expert clinical documentation specialist with extensive experience in occupational therapy and medico-legal report writing.
+
+## IMPORTANT GUIDELINES
+
+1. MAINTAIN ALL PLACEHOLDERS: The content has been de-identified, with placeholders like [NAME_abc123] or [DATE_xyz789]. You MUST preserve these placeholders EXACTLY as they appear.
+
+2. CLINICAL LANGUAGE: Use precise, professional terminology appropriate for occupational therapy assessments, while maintaining clarity for non-clinical readers.
+"""
+    
     def __init__(self, config_path=None):
         """
         Initialize the Claude API client.
@@ -31,26 +229,209 @@ class ClaudeAPIClient:
         if config_path is None:
             config_path = Path(__file__).parent.parent.parent / "config.json"
         
-        with open(config_path, 'r') as f:
-            config = json.load(f)
+        config = load_config(str(config_path))
         
         self.api_config = config['api']
         self.api_key = os.environ.get("CLAUDE_API_KEY")
         
         # Rate limiting configuration
         self.last_request_time = 0
-        self.min_request_interval = 10  # Seconds
+        self._rate_limit_lock = threading.Lock()
+        self.min_request_interval = 0  # Seconds; optional floor, throttling is driven by the API's rate limit headers
+        self._rl = {"req_remaining": math.inf, "tok_remaining": math.inf, "reset": 0}
         self.max_retries = 3
         self.initial_retry_delay = 20  # Seconds
         self.concurrent_request = False  # Flag to avoid concurrent requests
+        self._stop = threading.Event()  # Set by shutdown() to cancel waiting workers
+        
+        # Share one HTTP client across threads so connections to the API are
+        # kept alive between calls; with HTTP/2 concurrent requests are
+        # multiplexed over a single connection. The read timeout bounds the
+        # gap between streamed events rather than the whole response.
+        self._headers = {
+            "x-api-key": self.api_key or "",
+            "Content-Type": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+            "anthropic-version": "2023-06-01",
+            "anthropic-beta": "prompt-caching-2024-07-31"
+        }
+        self._client = httpx.Client(
+            http2=HTTP2_SUPPORT,
+            headers=self._headers,
+            limits=httpx.Limits(max_connections=16, max_keepalive_connections=16),
+            timeout=httpx.Timeout(60.0, connect=5.0)
+        )
         
         if not self.api_key:
             print("Warning: CLAUDE_API_KEY environment variable not set")
+        else:
+            # Open the connection in the background so the first real request
+            # does not pay for the TCP/TLS handshake
+            threading.Thread(target=self._prewarm, daemon=True).start()
+        
+        # Response cache directory, created once here
+        self._cache_dir = CACHE_DIR
+        self._migrate_legacy_cache()
+        self._cache = self._open_cache()
+        self._cache_lock = threading.Lock()
+    
+    def _prewarm(self):
+        """Establish a pooled connection to the API host ahead of the first request."""
+        try:
+            self._client.head(self.api_config["endpoint"], timeout=5)
+        except Exception:
+            # Only an optimization; the first request will connect normally
+            pass
+    
+    def _migrate_legacy_cache(self):
+        """
+        Move aside a cache directory written in an older format.
+        
+        Older caches were one .txt file per response (keyed with hash(), which
+        depended on PYTHONHASHSEED, or later with BLAKE2b digests). They are
+        not read any more, so the old directory is renamed to cache.legacy once.
+        """
+        marker = self._cache_dir / CACHE_FORMAT_MARKER
+        try:
+            if self._cache_dir.exists() and not marker.exists():
+                legacy_dir = self._cache_dir.with_name("cache.legacy")
+                if not legacy_dir.exists():
+                    self._cache_dir.rename(legacy_dir)
+                    print(f"Moved legacy response cache to {legacy_dir}")
+            self._cache_dir.mkdir(parents=True, exist_ok=True)
+            marker.touch(exist_ok=True)
+        except OSError as e:
+            print(f"✗ Error preparing cache directory: {str(e)}")
+    
+    def _open_cache(self):
+        """
+        Open the SQLite response cache, creating the table if needed.
+        
+        Returns:
+            sqlite3 connection, or None if the cache could not be opened
+        """
+        try:
+            conn = sqlite3.connect(str(self._cache_dir / CACHE_DB_NAME), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA mmap_size=268435456")
+            conn.execute("CREATE TABLE IF NOT EXISTS kv (k TEXT PRIMARY KEY, v TEXT NOT NULL)")
+            conn.commit()
+            return conn
+        except sqlite3.Error as e:
+            print(f"✗ Error opening response cache: {str(e)}")
+            return None
+    
+    def _cache_get(self, key):
+        """
+        Look up a cached response.
+        
+        Args:
+            key: Cache key
+            
+        Returns:
+            Cached text, or None on a miss
+        """
+        if self._cache is None:
+            return None
+        with self._cache_lock:
+            row = self._cache.execute("SELECT v FROM kv WHERE k = ?", (key,)).fetchone()
+        return row[0] if row else None
+    
+    def _cache_put(self, key, value):
+        """
+        Store a response in the cache.
+        
+        Args:
+            key: Cache key
+            value: Text to cache
+        """
+        if self._cache is None:
+            return
+        with self._cache_lock:
+            self._cache.execute("INSERT OR REPLACE INTO kv (k, v) VALUES (?, ?)", (key, value))
+            self._cache.commit()
+    
+    @staticmethod
+    def _content_digest(section_name, content):
+        """
+        Compute a stable digest of a section's content for cache keys.
+        
+        Args:
+            section_name: Name of the report section
+            content: Content to hash
+            
+        Returns:
+            Hex digest that is identical across runs
+        """
+        data = f"{section_name}\0{content}".encode("utf-8")
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+    
+    def shutdown(self):
+        """
+        Cancel all waiting and retrying API calls and close the client.
+        
+        Workers sleeping on rate limits or retry backoff wake up immediately
+        and raise KeyboardInterrupt.
+        """
+        self._stop.set()
+        self.close()
+    
+    def _sleep(self, seconds):
+        """
+        Sleep for the given time unless the client is shut down first.
+        
+        Raises:
+            KeyboardInterrupt: If shutdown() is called while waiting
+        """
+        if self._stop.wait(seconds):
+            raise KeyboardInterrupt("Claude API client was shut down")
+    
+    def close(self):
+        """Close the HTTP client and the response cache."""
+        client = getattr(self, "_client", None)
+        if client is not None:
+            client.close()
+        cache = getattr(self, "_cache", None)
+        if cache is not None:
+            with self._cache_lock:
+                cache.close()
+            self._cache = None
+    
+    def __del__(self):
+        """Release pooled connections when the client is garbage collected."""
+        try:
+            self.close()
+        except Exception:
+            pass
+    
+    def prepare_system_prompt(self, section_name):
+        """
+        Prepare the system instructions for a full-section request.
+        
+        The static instructions and the section guidance are sent as separate
+        system blocks marked for prompt caching, so repeated requests in a run
+        reuse them instead of having the API re-process them every time.
+        
+        Args:
+            section_name: Name of the report section
+            
+        Returns:
+            List of system content blocks for Claude API
+        """
+        section_text = _SECTION_SYSTEM_TEXT.get(section_name, _DEFAULT_SECTION_SYSTEM_TEXT)
+        return [
+            {"type": "text", "text": self.STATIC_SYSTEM, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": section_text, "cache_control": {"type": "ephemeral"}}
+        ]
     
     def prepare_prompt(self, section_name, content):
         """
         Prepare a prompt for the Claude API based on the section and content.
         
+        The instructions are sent separately as system blocks, see
+        prepare_system_prompt.
+        
         Args:
             section_name: Name of the report section
             content: De-identified content for this section
@@ -58,66 +439,190 @@ class ClaudeAPIClient:
         Returns:
             Formatted prompt for Claude API
         """
-        # Format the section name for readability
-        formatted_section = section_name.replace('_', ' ').title()
+        return _PROMPT_TEMPLATE.format(
+            formatted_section=section_name.replace('_', ' ').title(),
+            content=content
+        )
+    
+    def generate_narratives_batched(self, sections):
+        """
+        Generate enhanced narratives for several sections, batching short ones.
         
-        # Define section-specific guidance
-        section_guidance = {
-            "case_synopsis": "Provide a concise overview of the client's situation, reason for referral, and general assessment purpose. Focus on clarity and context.",
-            "background_information": "Organize relevant history chronologically. Highlight key events that impact current function. Include relevant personal, medical, and vocational history.",
-            "assessment_methodology": "Detail evaluation methods with specific tests performed and standardized measures. Describe the assessment environment and any adaptations made.",
-            "functional_observations": "Present objective findings in clear categories (physical, cognitive, emotional). Link observations to functional impact and daily activities.",
-            "activities_of_daily_living": "Structure by activity type (self-care, instrumental ADLs, etc.). For each activity, describe current ability, limitations, and adaptations.",
-            "social_functioning": "Describe interpersonal capabilities, community integration, and support systems. Note changes from pre-injury/illness baseline if mentioned.",
-            "concentration_persistence_pace": "Detail attentional capacity, task sustainability, and work rhythm. Include specific examples of performance limitations and strengths.",
-            "adaptability_work_settings": "Analyze ability to adapt to various environments and respond to workplace demands. Note specific accommodations that may be beneficial.",
-            "summary_recommendations": "Synthesize key findings and provide clear, specific recommendations tied directly to assessment results. Prioritize recommendations by importance."
-        }
+        Sections whose combined content fits within the batch budget
+        (api.batch_max_chars, by default two characters per output token in
+        api.max_tokens) are sent together in a single request that asks for a
+        JSON object keyed by section name. A batch whose response is cut off
+        at max_tokens is split in half and retried. Larger sections, and any
+        section missing from a batched response, go through generate_narrative
+        individually.
         
-        # Get guidance for this section, or use default if not found
-        guidance = section_guidance.get(section_name, "Organize content logically and enhance clarity while maintaining all clinical information.")
+        Args:
+            sections: Dictionary of section names and de-identified content
+            
+        Returns:
+            Dictionary of section names and enhanced content
+        """
+        if not self.api_key:
+            print("Skipping enhancement - API key not set")
+            return dict(sections)
         
-        # Create a prompt that instructs Claude on the task
-        prompt = f"""
-You are an expert clinical documentation specialist with extensive experience in occupational therapy and medico-legal report writing. Your task is to enhance the following {formatted_section} section of a clinical report.
-
-## IMPORTANT GUIDELINES
-
-1. MAINTAIN ALL PLACEHOLDERS: The content has been de-identified, with placeholders like [NAME_abc123] or [DATE_xyz789]. You MUST preserve these placeholders EXACTLY as they appear.
-
-2. CLINICAL LANGUAGE: Use precise, professional terminology appropriate for occupational therapy assessments, while maintaining clarity for non-clinical readers.
-
-3. NARRATIVE STRUCTURE:
-   - Create smooth transitions between paragraphs
-   - Use appropriate headings and subheadings for organization
-   - Maintain a logical flow from observations to clinical interpretations
-   - Present information in order of clinical relevance
-
-4. CONTENT REQUIREMENTS:
-   - Preserve all factual information and clinical data from the original
-   - Do not introduce new medical facts, diagnoses, or clinical interpretations
-   - When describing functional limitations, clearly connect them to activities of daily living
-   - For assessments, clearly differentiate between objective findings and clinical impressions
-
-5. STYLE AND TONE:
-   - Maintain objective, evidence-based language
-   - Use active voice where appropriate
-   - Avoid redundancy and unnecessary repetition
-   - Eliminate vague or ambiguous statements
-   - Ensure statements are supported by the information provided
-
-6. SECTION-SPECIFIC GUIDANCE:
-{guidance}
-
-## ORIGINAL CONTENT TO ENHANCE:
-
-{content}
-
-## TASK:
-
-Please rewrite the {formatted_section} section, adhering to all guidelines above. Your response should be a cohesive, well-structured narrative ready to be integrated into a professional clinical report. Maintain all clinical accuracy while improving readability and professional quality.
-"""
-        return prompt
+        # Enhanced prose runs about as long as its input, so keep a batch's
+        # input well inside what the response can hold
+        budget = self.api_config.get("batch_max_chars", 2 * self.api_config["max_tokens"])
+        results = {}
+        individual = []
+        batches = []
+        current_batch = {}
+        current_size = 0
+        
+        for section_name, content in sections.items():
+            # Nothing to enhance
+            if not content or not content.strip():
+                results[section_name] = content
+                continue
+            
+            # Reuse cached results without spending space in a batch
+            try:
+                cached_content = self._cache_get(f"{section_name}_{self._content_digest(section_name, content)}")
+            except Exception as e:
+                print(f"✗ Error reading cache: {str(e)}")
+                cached_content = None
+            if cached_content is not None:
+                print(f"✓ Using cached results for {section_name.replace('_', ' ').title()}")
+                results[section_name] = cached_content
+                continue
+            
+            if len(content) > budget:
+                individual.append(section_name)
+                continue
+            
+            if current_batch and current_size + len(content) > budget:
+                batches.append(current_batch)
+                current_batch = {}
+                current_size = 0
+            current_batch[section_name] = content
+            current_size += len(content)
+        
+        if current_batch:
+            batches.append(current_batch)
+        
+        # Batches and individual sections are independent, network-bound
+        # requests, so send them concurrently; the shared rate limiter still
+        # spaces out the actual calls
+        with ThreadPoolExecutor(max_workers=self.api_config.get("concurrency", 4)) as executor:
+            individual_futures = {
+                section_name: executor.submit(self.generate_narrative, section_name, sections[section_name])
+                for section_name in individual
+            }
+            batch_futures = [executor.submit(self._enhance_batch, batch) for batch in batches]
+            
+            for future in batch_futures:
+                enhanced, leftover = future.result()
+                results.update(enhanced)
+                # Anything a batch could not enhance is processed on its own
+                for section_name in leftover:
+                    individual_futures[section_name] = executor.submit(
+                        self.generate_narrative, section_name, sections[section_name]
+                    )
+            
+            for section_name, future in individual_futures.items():
+                results[section_name] = future.result()
+        
+        # Keep the caller's section order
+        return {section_name: results[section_name] for section_name in sections}
+    
+    def _enhance_batch(self, batch):
+        """
+        Enhance a batch of sections, splitting it if the response is truncated.
+        
+        Args:
+            batch: Dictionary of section names and de-identified content
+            
+        Returns:
+            Tuple of (dictionary of enhanced sections, list of section names
+            that still need to go through generate_narrative individually)
+        """
+        if len(batch) == 1:
+            return {}, list(batch)
+        
+        enhanced = self._generate_batch(batch)
+        if enhanced is None:
+            # Cut off at max_tokens: retry as two smaller batches
+            items = list(batch.items())
+            half = len(items) // 2
+            first, first_leftover = self._enhance_batch(dict(items[:half]))
+            second, second_leftover = self._enhance_batch(dict(items[half:]))
+            first.update(second)
+            return first, first_leftover + second_leftover
+        
+        results = {}
+        leftover = []
+        for section_name, content in batch.items():
+            text = enhanced.get(section_name)
+            if isinstance(text, str) and text.strip():
+                results[section_name] = text
+                try:
+                    self._cache_put(f"{section_name}_{self._content_digest(section_name, content)}", text)
+                except Exception as e:
+                    print(f"✗ Error writing cache: {str(e)}")
+            else:
+                leftover.append(section_name)
+        return results, leftover
+    
+    def _generate_batch(self, batch):
+        """
+        Enhance several sections with a single API request.
+        
+        Args:
+            batch: Dictionary of section names and de-identified content
+            
+        Returns:
+            Dictionary of section names and enhanced content; empty if the
+            request failed or the response was not valid JSON, None if the
+            response was truncated at max_tokens
+        """
+        section_ids = ", ".join(batch)
+        print(f"\n==== PROCESSING BATCH: {section_ids} ====")
+        
+        parts = [
+            "\nYour task is to enhance each of the following sections of a clinical report.\n"
+        ]
+        for section_name, content in batch.items():
+            guidance = SECTION_GUIDANCE.get(section_name, DEFAULT_SECTION_GUIDANCE)
+            parts.append(
+                f"## SECTION ID: {section_name} ({section_name.replace('_', ' ').title()})\n\n"
+                f"Guidance: {guidance}\n\n"
+                f"{content}\n"
+            )
+        parts.append(f"## TASK:\n\nReturn a JSON object with exactly these keys: {section_ids}.\n")
+        prompt = "\n".join(parts)
+        
+        system = [
+            {"type": "text", "text": self.STATIC_SYSTEM, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": _BATCH_SYSTEM_TEXT, "cache_control": {"type": "ephemeral"}}
+        ]
+        result = self._call_claude_api(prompt, f"batch ({section_ids})", system=system, with_stop_reason=True)
+        if not result:
+            return {}
+        result, stop_reason = result
+        if stop_reason == "max_tokens":
+            print(f"⚠ Batched response for {section_ids} was truncated at max_tokens; splitting the batch")
+            return None
+        
+        # Tolerate code fences or stray text around the JSON object
+        start = result.find("{")
+        end = result.rfind("}")
+        if start < 0 or end < start:
+            print("✗ Batched response was not JSON; processing sections individually")
+            return {}
+        try:
+            payload = result[start:end + 1]
+            parsed = orjson.loads(payload) if ORJSON_SUPPORT else json.loads(payload)
+        except ValueError:
+            print("✗ Batched response was not valid JSON; processing sections individually")
+            return {}
+        
+        return parsed if isinstance(parsed, dict) else {}
     
     def generate_custom_narrative(self, section_name, content, custom_prompt_template):
         """
@@ -131,6 +636,10 @@ Please rewrite the {formatted_section} section, adhering to all guidelines above
         Returns:
             Enhanced narrative content
         """
+        # Nothing to enhance
+        if not content or not content.strip():
+            return content
+        
         if not self.api_key:
             print(f"Skipping enhancement for {section_name} - API key not set")
             return content
@@ -149,18 +658,19 @@ Please rewrite the {formatted_section} section, adhering to all guidelines above
         Implement rate limiting by waiting between API calls.
         Ensures we don't exceed Claude API's rate limits.
         """
-        current_time = time.time()
+        current_time = time.monotonic()
         elapsed = current_time - self.last_request_time
         
         # If we've made a request recently, wait until minimum interval has passed
         if elapsed < self.min_request_interval:
             wait_time = self.min_request_interval - elapsed
             print(f"Rate limiting: Waiting {wait_time:.1f} seconds before next API call...")
-            time.sleep(wait_time)
+            self._sleep(wait_time)
         
         # Update last request time
-        self.last_request_time = time.time()
+        self.last_request_time = time.monotonic()
     
+    @log_calls("Starting processing of {title}", "Completed processing of {title}")
     def generate_narrative(self, section_name, content):
         """
         Generate an enhanced narrative for a report section using Claude API.
@@ -173,48 +683,44 @@ Please rewrite the {formatted_section} section, adhering to all guidelines above
         Returns:
             Enhanced narrative content
         """
+        # Nothing to enhance
+        if not content or not content.strip():
+            return content
+        
         if not self.api_key:
             print(f"Skipping enhancement for {section_name} - API key not set")
             return content
 
-        # Use a unique identifier for the content to prevent duplicate processing
-        content_id = f"{section_name}_{hash(content)}"
+        # Use a unique identifier for the content to prevent duplicate processing;
+        # the same key names the cached response
+        content_id = f"{section_name}_{self._content_digest(section_name, content)}"
         
-        # Check if this section is already being processed
-        if content_id in processing_sections:
-            print(f"⚠ Section {section_name} is already being processed elsewhere. Skipping duplicate.")
-            return content
-            
-        # Acquire a lock for this section to prevent concurrent processing
-        if section_name not in section_locks:
-            section_locks[section_name] = threading.Lock()
-            
-        # Try to acquire the lock, but don't block if it's already locked
-        if not section_locks[section_name].acquire(blocking=False):
-            print(f"⚠ Another thread is processing section {section_name}. Skipping duplicate.")
-            return content
+        # If identical content is already being processed, wait for it to
+        # finish so its cached result can be reused instead of calling twice
+        while True:
+            with _inflight_lock:
+                pending = _inflight.get(content_id)
+                if pending is None:
+                    done_event = threading.Event()
+                    _inflight[content_id] = done_event
+                    break
+            print(f"⚠ Section {section_name} is already being processed elsewhere. Waiting for it to finish.")
+            pending.wait()
             
         try:
-            # Add to the set of processing sections
-            processing_sections.add(content_id)
-        
             # Format section name for logging
             formatted_section = section_name.replace('_', ' ').title()
             print(f"\n==== PROCESSING SECTION: {formatted_section} ====")
             
             # Cache the response to avoid duplicate processing
-            cache_key = f"{section_name}_{hash(content)}"
-            cache_file = Path(__file__).parent.parent.parent / "cache" / f"{cache_key}.txt"
-            
             # Check if we have a cached result
-            if cache_file.parent.exists() and cache_file.exists():
-                try:
-                    with open(cache_file, 'r', encoding='utf-8') as f:
-                        cached_content = f.read()
+            try:
+                cached_content = self._cache_get(content_id)
+                if cached_content is not None:
                     print(f"✓ Using cached results for {formatted_section}")
                     return cached_content
-                except Exception as e:
-                    print(f"✗ Error reading cache: {str(e)}")
+            except Exception as e:
+                print(f"✗ Error reading cache: {str(e)}")
             
             # If content is very large, split it into chunks
             max_chunk_size = 6000  # Characters per chunk
@@ -224,49 +730,15 @@ Please rewrite the {formatted_section} section, adhering to all guidelines above
                 total_chunks = len(chunks)
                 print(f"→ Section {formatted_section} split into {total_chunks} chunks due to size")
                 
-                # Process each chunk sequentially
-                enhanced_chunks = []
-                for i, chunk in enumerate(chunks):
-                    chunk_num = i + 1
-                    print(f"\n-- Processing chunk {chunk_num}/{total_chunks} for {formatted_section} --")
-                    
-                    # Create a unique cache key for this chunk
-                    chunk_cache_key = f"{section_name}_chunk{chunk_num}_{hash(chunk)}"
-                    chunk_cache_file = Path(__file__).parent.parent.parent / "cache" / f"{chunk_cache_key}.txt"
-                    
-                    # Check if we have a cached result for this chunk
-                    if chunk_cache_file.parent.exists() and chunk_cache_file.exists():
-                        try:
-                            with open(chunk_cache_file, 'r', encoding='utf-8') as f:
-                                cached_chunk = f.read()
-                            print(f"✓ Using cached results for chunk {chunk_num}/{total_chunks}")
-                            enhanced_chunks.append(cached_chunk)
-                            continue
-                        except Exception as e:
-                            print(f"✗ Error reading chunk cache: {str(e)}")
-                    
-                    # Prepare the prompt for this chunk with context about chunking
-                    chunk_prompt = self._prepare_chunk_prompt(section_name, chunk, chunk_num, total_chunks)
-                    
-                    # Call the API and handle potential rate limits with retries
-                    enhanced_chunk = self._call_claude_api(chunk_prompt, f"{section_name} chunk {chunk_num}")
-                    
-                    # If we got a valid response
-                    if enhanced_chunk and enhanced_chunk != chunk_prompt:
-                        enhanced_chunks.append(enhanced_chunk)
-                        
-                        # Cache the result for this chunk
-                        try:
-                            os.makedirs(chunk_cache_file.parent, exist_ok=True)
-                            with open(chunk_cache_file, 'w', encoding='utf-8') as f:
-                                f.write(enhanced_chunk)
-                            print(f"✓ Cached chunk {chunk_num}/{total_chunks}")
-                        except Exception as e:
-                            print(f"✗ Error writing chunk cache: {str(e)}")
-                    else:
-                        # If API failed, use original content
-                        print(f"! Using original content for chunk {chunk_num}/{total_chunks} due to API failure")
-                        enhanced_chunks.append(chunk)
+                # Process chunks concurrently; each call is network-bound and the
+                # shared rate limiter still spaces out the actual requests
+                max_workers = min(self.api_config.get("concurrency", 4), total_chunks)
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    futures = [
+                        executor.submit(self._process_one_chunk, section_name, chunk, i + 1, total_chunks)
+                        for i, chunk in enumerate(chunks)
+                    ]
+                    enhanced_chunks = [future.result() for future in futures]
                 
                 # Combine the enhanced chunks
                 print(f"\n✓ Combining {len(enhanced_chunks)} enhanced chunks for {formatted_section}")
@@ -274,9 +746,7 @@ Please rewrite the {formatted_section} section, adhering to all guidelines above
                 
                 # Cache the combined result
                 try:
-                    os.makedirs(cache_file.parent, exist_ok=True)
-                    with open(cache_file, 'w', encoding='utf-8') as f:
-                        f.write(combined_content)
+                    self._cache_put(content_id, combined_content)
                     print(f"✓ Cached complete section: {formatted_section}")
                 except Exception as e:
                     print(f"✗ Error writing cache: {str(e)}")
@@ -286,15 +756,15 @@ Please rewrite the {formatted_section} section, adhering to all guidelines above
                 # Process normal-sized content
                 print(f"→ Processing entire section (single chunk)")
                 prompt = self.prepare_prompt(section_name, content)
-                result = self._call_claude_api(prompt, section_name)
+                result = self._call_claude_api(
+                    prompt, section_name, system=self.prepare_system_prompt(section_name)
+                )
                 
                 # If we got a valid response
                 if result and result != prompt:
                     # Cache the result
                     try:
-                        os.makedirs(cache_file.parent, exist_ok=True)
-                        with open(cache_file, 'w', encoding='utf-8') as f:
-                            f.write(result)
+                        self._cache_put(content_id, result)
                         print(f"✓ Cached section: {formatted_section}")
                     except Exception as e:
                         print(f"✗ Error writing cache: {str(e)}")
@@ -305,9 +775,61 @@ Please rewrite the {formatted_section} section, adhering to all guidelines above
                     print(f"! Using original content for {formatted_section} due to API failure")
                     return content
         finally:
-            # Always release resources
-            processing_sections.discard(content_id)
-            section_locks[section_name].release()
+            # Always release resources and wake any waiting duplicates
+            with _inflight_lock:
+                _inflight.pop(content_id, None)
+            done_event.set()
+    
+    def _process_one_chunk(self, section_name, chunk, chunk_num, total_chunks):
+        """
+        Enhance a single chunk of a section, using the cache when possible.
+        
+        Args:
+            section_name: Name of the report section
+            chunk: The content chunk
+            chunk_num: The current chunk number
+            total_chunks: Total number of chunks
+            
+        Returns:
+            Enhanced chunk, or the original chunk if the API call failed
+        """
+        formatted_section = section_name.replace('_', ' ').title()
+        print(f"\n-- Processing chunk {chunk_num}/{total_chunks} for {formatted_section} --")
+        
+        # Create a unique cache key for this chunk
+        chunk_cache_key = f"{section_name}_chunk{chunk_num}_{self._content_digest(section_name, chunk)}"
+        
+        # Check if we have a cached result for this chunk
+        try:
+            cached_chunk = self._cache_get(chunk_cache_key)
+            if cached_chunk is not None:
+                print(f"✓ Using cached results for chunk {chunk_num}/{total_chunks}")
+                return cached_chunk
+        except Exception as e:
+            print(f"✗ Error reading chunk cache: {str(e)}")
+        
+        # Prepare the prompt for this chunk with context about chunking
+        chunk_prompt = self._prepare_chunk_prompt(section_name, chunk, chunk_num, total_chunks)
+        
+        # Call the API and handle potential rate limits with retries
+        enhanced_chunk = self._call_claude_api(
+            chunk_prompt, f"{section_name} chunk {chunk_num}",
+            system=self._prepare_chunk_system_prompt()
+        )
+        
+        # If API failed, use original content
+        if not enhanced_chunk or enhanced_chunk == chunk_prompt:
+            print(f"! Using original content for chunk {chunk_num}/{total_chunks} due to API failure")
+            return chunk
+        
+        # Cache the result for this chunk
+        try:
+            self._cache_put(chunk_cache_key, enhanced_chunk)
+            print(f"✓ Cached chunk {chunk_num}/{total_chunks}")
+        except Exception as e:
+            print(f"✗ Error writing chunk cache: {str(e)}")
+        
+        return enhanced_chunk
     
     def _split_content_into_chunks(self, content, max_chunk_size):
         """
@@ -320,51 +842,50 @@ Please rewrite the {formatted_section} section, adhering to all guidelines above
         Returns:
             List of content chunks
         """
-        # Try to split at paragraph breaks
-        paragraphs = content.split('\n\n')
         chunks = []
-        current_chunk = ""
+        chunk_start = 0
+        # Break points inside the current chunk as (text_end, next_start, is_paragraph)
+        boundaries = []
         
-        for para in paragraphs:
-            # If adding this paragraph would exceed max size, start a new chunk
-            if len(current_chunk) + len(para) + 2 > max_chunk_size and current_chunk:
-                chunks.append(current_chunk)
-                current_chunk = para
-            else:
-                if current_chunk:
-                    current_chunk += "\n\n" + para
-                else:
-                    current_chunk = para
+        # Walk the break points once; the end of the content acts as a final one
+        break_points = itertools.chain(
+            ((m.start(), m.end(), m.group().startswith('\n\n')) for m in _CHUNK_BOUNDARY_RE.finditer(content)),
+            [(len(content), len(content), True)]
+        )
+        
+        for text_end, next_start, is_paragraph in break_points:
+            # If the text up to this point is too long, cut at the latest paragraph
+            # break, or at the latest sentence break if the paragraph is too long
+            while text_end - chunk_start > max_chunk_size and boundaries:
+                paragraph_breaks = [b for b in boundaries if b[2]]
+                cut = paragraph_breaks[-1] if paragraph_breaks else boundaries[-1]
+                if cut[0] > chunk_start:
+                    chunks.append(content[chunk_start:cut[0]])
+                chunk_start = cut[1]
+                boundaries = [b for b in boundaries if b[0] > chunk_start]
+            
+            boundaries.append((text_end, next_start, is_paragraph))
         
         # Add the last chunk if it's not empty
-        if current_chunk:
-            chunks.append(current_chunk)
-        
-        # If any chunks are still too large, split them further
-        final_chunks = []
-        for chunk in chunks:
-            if len(chunk) > max_chunk_size:
-                # Split at sentence boundaries
-                sentences = []
-                for para in chunk.split('\n\n'):
-                    # Basic sentence splitting (not perfect but good enough)
-                    para_sentences = para.replace('. ', '.\n').replace('! ', '!\n').replace('? ', '?\n').split('\n')
-                    sentences.extend([s + ' ' for s in para_sentences if s])
-                
-                sub_chunk = ""
-                for sentence in sentences:
-                    if len(sub_chunk) + len(sentence) > max_chunk_size and sub_chunk:
-                        final_chunks.append(sub_chunk)
-                        sub_chunk = sentence
-                    else:
-                        sub_chunk += sentence
-                
-                if sub_chunk:
-                    final_chunks.append(sub_chunk)
-            else:
-                final_chunks.append(chunk)
+        if chunk_start < len(content):
+            chunks.append(content[chunk_start:])
         
-        return final_chunks
+        return chunks
+    
+    def _prepare_chunk_system_prompt(self):
+        """
+        Prepare the system instructions for a chunk request.
+        
+        Chunk numbers are kept out of these blocks so that they are identical
+        for every chunk and can be served from the prompt cache.
+        
+        Returns:
+            List of system content blocks for Claude API
+        """
+        return [
+            {"type": "text", "text": self.STATIC_SYSTEM, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": _CHUNK_SYSTEM_TEXT, "cache_control": {"type": "ephemeral"}}
+        ]
     
     def _prepare_chunk_prompt(self, section_name, chunk, chunk_num, total_chunks):
         """
@@ -379,40 +900,12 @@ Please rewrite the {formatted_section} section, adhering to all guidelines above
         Returns:
             Formatted prompt for Claude API
         """
-        # Format the section name for readability
-        formatted_section = section_name.replace('_', ' ').title()
-        
-        # Create a prompt that instructs Claude on the chunk processing task
-        prompt = f"""
-You are an expert clinical documentation specialist enhancing a {formatted_section} section that has been split into {total_chunks} parts due to length. This is part {chunk_num} of {total_chunks}.
-
-## IMPORTANT GUIDELINES
-
-1. MAINTAIN ALL PLACEHOLDERS: The content has been de-identified, with placeholders like [NAME_abc123] or [DATE_xyz789]. You MUST preserve these placeholders EXACTLY as they appear.
-
-2. CLINICAL LANGUAGE: Use precise, professional terminology appropriate for occupational therapy assessments, while maintaining clarity for non-clinical readers.
-
-3. CONTENT INTEGRITY: 
-   - Enhance only this chunk - don't worry about connections to other chunks
-   - Maintain all clinical facts and information from the original
-   - Do not introduce new medical facts or diagnoses
-   - If a sentence is cut off, finish it naturally based on context
-
-4. STYLE AND TONE:
-   - Maintain objective, evidence-based language
-   - Use active voice where appropriate
-   - Eliminate redundancy and vague statements
-   - Ensure statements are supported by the information provided
-
-## ORIGINAL CHUNK {chunk_num}/{total_chunks} TO ENHANCE:
-
-{chunk}
-
-## TASK:
-
-Provide an enhanced version of this chunk. Your response should improve clinical readability while maintaining all facts and placeholders exactly.
-"""
-        return prompt
+        return _CHUNK_PROMPT_TEMPLATE.format(
+            formatted_section=section_name.replace('_', ' ').title(),
+            chunk=chunk,
+            chunk_num=chunk_num,
+            total_chunks=total_chunks
+        )
     
     def _combine_enhanced_chunks(self, chunks):
         """
@@ -424,35 +917,37 @@ Provide an enhanced version of this chunk. Your response should improve clinical
         Returns:
             Combined narrative content
         """
-        # Join chunks with paragraph breaks
-        combined = "\n\n".join(chunks)
-        
-        # Fix any issues with consecutive paragraph breaks
-        combined = combined.replace("\n\n\n\n", "\n\n")
-        combined = combined.replace("\n\n\n", "\n\n")
-        
-        return combined
+        # Join chunks with paragraph breaks, collapsing any longer runs of
+        # blank lines into a single paragraph break
+        return _BLANK_LINES_RE.sub("\n\n", "\n\n".join(chunks))
     
-    def _call_claude_api(self, prompt, section_identifier):
+    @log_calls("Sending API request for {section_identifier}",
+               "API request successful for {section_identifier}",
+               "API request failed for {section_identifier}")
+    def _call_claude_api(self, prompt, section_identifier, system=None, with_stop_reason=False):
         """
         Call the Claude API with rate limiting and retries.
         
         Args:
             prompt: The prepared prompt to send to Claude
             section_identifier: Name of section for logging
+            system: Optional list of system content blocks
+            with_stop_reason: Return the response's stop reason along with the text
             
         Returns:
-            Generated content or None on failure
+            Generated content, or a (content, stop_reason) tuple when
+            with_stop_reason is set; None on failure
         """
-        # Return original if no API key
-        if not self.api_key:
+        # Return original if no API key or nothing to send
+        if not self.api_key or not prompt or not prompt.strip():
             return None
             
-        # Check if we should wait before making a request
-        self._apply_rate_limiting()
+        # Rough token estimate (~4 characters per token) plus the output budget
+        system_chars = sum(len(block["text"]) for block in system) if system else 0
+        expected_tokens = (len(prompt) + system_chars) // 4 + self.api_config["max_tokens"]
         
-        # Track the current time
-        self.last_request_time = time.time()
+        # Check if we should wait before making a request
+        self._apply_rate_limiting(expected_tokens)
         
         # Try to make the API call with retries
         retry_count = 0
@@ -461,78 +956,226 @@ Provide an enhanced version of this chunk. Your response should improve clinical
         
         while retry_count <= max_retries:
             try:
-                # Start with a reasonable timeout
-                timeout = 60  # seconds
-                
-                headers = {
-                    "x-api-key": self.api_key,
-                    "Content-Type": "application/json",
-                    "anthropic-version": "2023-06-01"
-                }
-                
                 data = {
                     "model": self.api_config["model"],
                     "messages": [
                         {"role": "user", "content": prompt}
                     ],
                     "max_tokens": self.api_config["max_tokens"],
-                    "temperature": 0.3  # Lower temperature for more consistent outputs
+                    "temperature": 0.3,  # Lower temperature for more consistent outputs
+                    "stream": True
                 }
+                if system:
+                    data["system"] = system
                 
                 print(f"⟳ Sending API request for {section_identifier}...")
                 
-                response = requests.post(
-                    self.api_config["endpoint"],
-                    headers=headers,
-                    json=data,
-                    timeout=timeout
-                )
+                body, headers = self._encode_request_body(data)
                 
-                if response.status_code == 200:
-                    # Success!
-                    result = response.json()
-                    generated_text = result['content'][0]['text']
-                    print(f"✓ API request successful for {section_identifier} ({len(generated_text)} chars)")
-                    return generated_text
+                with self._client.stream("POST", self.api_config["endpoint"], content=body, headers=headers) as response:
+                    self._update_rate_limits(response.headers)
+                    
+                    if response.status_code == 200:
+                        # Success!
+                        generated_text, stop_reason = self._read_stream(response)
+                        print(f"✓ API request successful for {section_identifier} ({len(generated_text)} chars)")
+                        if stop_reason == "max_tokens":
+                            print(f"⚠ Response for {section_identifier} was truncated at max_tokens")
+                        return (generated_text, stop_reason) if with_stop_reason else generated_text
+                    
+                    error_text = response.read().decode('utf-8', errors='replace')
                     
-                elif response.status_code == 429:
+                if response.status_code == 429:
                     # Rate limit exceeded
                     retry_count += 1
-                    actual_retry_delay = retry_delay * (2 ** (retry_count - 1))  # Exponential backoff
+                    actual_retry_delay = self._parse_retry_after(response.headers)
+                    if actual_retry_delay is None:
+                        actual_retry_delay = retry_delay * (2 ** (retry_count - 1))  # Exponential backoff
                     
                     if retry_count <= max_retries:
+                        # Pause every worker, not just this one, then wait our turn
+                        self._defer_all_requests(actual_retry_delay)
                         print(f"⚠ Rate limit exceeded. Retrying in {actual_retry_delay} seconds (attempt {retry_count}/{max_retries})...")
-                        time.sleep(actual_retry_delay)
+                        self._apply_rate_limiting(expected_tokens)
                     else:
                         print(f"✗ Rate limit exceeded. Maximum retries reached for {section_identifier}.")
                         return None
                         
                 else:
                     # Other error
-                    print(f"✗ API error: {response.status_code} - {response.text}")
+                    print(f"✗ API error: {response.status_code} - {error_text}")
                     return None
                     
             except Exception as e:
                 retry_count += 1
                 if retry_count <= max_retries:
                     print(f"⚠ API request failed: {str(e)}. Retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
+                    self._sleep(retry_delay)
                 else:
                     print(f"✗ API request failed after {max_retries} retries: {str(e)}")
                     return None
         
         return None
 
-    def _apply_rate_limiting(self):
+    def _encode_request_body(self, data):
+        """
+        Serialize a request payload, gzip-compressing it when large enough.
+        
+        Args:
+            data: Request payload
+            
+        Returns:
+            Tuple of (body bytes, extra request headers)
+        """
+        if ORJSON_SUPPORT:
+            body = orjson.dumps(data)
+        else:
+            body = json.dumps(data).encode('utf-8')
+        if self.api_config.get("compress_requests", True) and len(body) >= GZIP_MIN_BYTES:
+            return gzip.compress(body), {"Content-Encoding": "gzip"}
+        return body, {}
+    
+    def _read_stream(self, response):
+        """
+        Read a streamed (server-sent events) Messages API response.
+        
+        Text deltas are collected into a buffer as they arrive.
+        
+        Args:
+            response: Streaming response from the Messages API
+            
+        Returns:
+            Tuple of (generated text, stop reason such as "end_turn" or "max_tokens")
+        """
+        buffer = io.StringIO()
+        stop_reason = None
+        
+        for line in response.iter_lines():
+            if not line.startswith("data:"):
+                continue
+            event = orjson.loads(line[5:]) if ORJSON_SUPPORT else json.loads(line[5:])
+            event_type = event.get("type")
+            
+            if event_type == "content_block_delta":
+                buffer.write(event.get("delta", {}).get("text", ""))
+            elif event_type == "message_delta":
+                stop_reason = event.get("delta", {}).get("stop_reason") or stop_reason
+            elif event_type == "message_stop":
+                return buffer.getvalue(), stop_reason
+            elif event_type == "error":
+                raise RuntimeError(event.get("error", {}).get("message", "Stream error"))
+        
+        raise RuntimeError("Response stream ended before the message was complete")
+    
+    def _update_rate_limits(self, headers):
+        """
+        Record the remaining quota reported in the API's rate limit headers.
+        
+        Args:
+            headers: Response headers from the last API call
+        """
+        req_remaining = headers.get("anthropic-ratelimit-requests-remaining")
+        tok_remaining = headers.get("anthropic-ratelimit-tokens-remaining")
+        resets = [
+            self._parse_reset_time(headers.get(name))
+            for name in ("anthropic-ratelimit-requests-reset", "anthropic-ratelimit-tokens-reset")
+        ]
+        resets = [reset for reset in resets if reset is not None]
+        
+        with self._rate_limit_lock:
+            try:
+                if req_remaining is not None:
+                    self._rl["req_remaining"] = int(req_remaining)
+                if tok_remaining is not None:
+                    self._rl["tok_remaining"] = int(tok_remaining)
+            except ValueError:
+                pass
+            if resets:
+                self._rl["reset"] = max(resets)
+    
+    @staticmethod
+    def _parse_reset_time(value):
+        """
+        Convert an RFC 3339 reset timestamp into a time.monotonic() deadline.
+        
+        The wall-clock offset is taken once here so that later waits are
+        unaffected by system clock adjustments.
+        """
+        if not value:
+            return None
+        try:
+            reset = datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            return None
+        return time.monotonic() + (reset - time.time())
+    
+    @staticmethod
+    def _parse_retry_after(headers):
+        """Return the retry-after delay in seconds, or None if not provided."""
+        try:
+            return max(0.0, float(headers.get("retry-after")))
+        except (TypeError, ValueError):
+            return None
+    
+    @classmethod
+    def _defer_all_requests(cls, delay):
+        """
+        Hold back requests from all workers after a rate limit error.
+        
+        A random jitter of up to a quarter of the delay is added so that
+        workers do not all retry at the same instant.
+        
+        Args:
+            delay: Seconds to wait before any further request
+        """
+        with cls._global_lock:
+            not_before = time.monotonic() + delay + random.uniform(0, delay * 0.25)
+            cls._global_not_before = max(cls._global_not_before, not_before)
+    
+    def _reserve_request_slot(self, expected_tokens=0):
+        """
+        Reserve the next request slot under the rate limit.
+        
+        Requests go out immediately while the last reported quota has room;
+        once requests or tokens run low, callers wait until the reported reset
+        time, and after a 429 everyone waits for the shared backoff. The slot
+        is claimed while holding a lock so concurrent workers draw down the
+        same quota instead of all firing at once.
+        
+        Args:
+            expected_tokens: Estimated tokens the request will consume
+            
+        Returns:
+            Number of seconds the caller must wait before sending its request
+        """
+        with self._rate_limit_lock:
+            current_time = time.monotonic()
+            next_slot = max(current_time, self.last_request_time + self.min_request_interval)
+            
+            if self._rl["req_remaining"] <= 1 or self._rl["tok_remaining"] < expected_tokens:
+                next_slot = max(next_slot, self._rl["reset"])
+            
+            with ClaudeAPIClient._global_lock:
+                next_slot = max(next_slot, ClaudeAPIClient._global_not_before)
+            
+            self._rl["req_remaining"] -= 1
+            self._rl["tok_remaining"] -= expected_tokens
+            self.last_request_time = next_slot
+            return next_slot - current_time
+    
+    def _apply_rate_limiting(self, expected_tokens=0):
         """Apply rate limiting before making an API call"""
-        current_time = time.time()
-        elapsed = current_time - self.last_request_time
+        wait_time = self._reserve_request_slot(expected_tokens)
         
-        if elapsed < self.min_request_interval:
-            wait_time = max(0, self.min_request_interval - elapsed)
-            if wait_time > 0.1:  # Only log if waiting more than 0.1 seconds
-                print(f"⏱️ Rate limiting: Waiting {wait_time:.1f} seconds...")
-                time.sleep(wait_time)
+        if wait_time > 0.1:  # Only log if waiting more than 0.1 seconds
+            print(f"⏱️ Rate limiting: Waiting {wait_time:.1f} seconds...")
+            if self.on_event is not None:
+                self.on_event(f"API rate limiting: Waiting {wait_time:.1f} seconds")
+        
+        # Short waits are still honoured; skipping them would let the
+        # request go out before its reserved slot
+        if wait_time > 0:
+            self._sleep(wait_time)
                 
     def is_available(self):
         """Check if the Claude API is available and configured correctly."""
@@ -5,9 +5,11 @@ This module provides a web interface for the Delilah Prime application.
 """
 
 import os
+import re
 import sys
 import json
-import glob
+import mmap
+import shutil
 from pathlib import Path
 import datetime
 from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory, jsonify, session, Response
@@ -19,6 +21,7 @@ import time
 from collections import defaultdict
 from queue import Queue, Empty
 from threading import Lock
+from concurrent.futures import ThreadPoolExecutor, wait
 
 # Make sure we can import from sibling directories
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -29,6 +32,13 @@ from src.api.claude_api import ClaudeAPIClient
 from src.processor.document_processor import DocumentProcessor
 from src.processor.report_generator import ReportGenerator
 
+# Fast JSON serialization when orjson is available
+try:
+    import orjson
+    ORJSON_SUPPORT = True
+except ImportError:
+    ORJSON_SUPPORT = False
+
 # Word document support
 try:
     from docx import Document
@@ -55,6 +65,8 @@ app = Flask(__name__, template_folder=os.path.join(os.path.dirname(os.path.dirna
 app.secret_key = os.environ.get('ENCRYPTION_KEY', 'delilah_prime_secure_key')
 app.config['SESSION_TYPE'] = 'filesystem'
 app.config['PERMANENT_SESSION_LIFETIME'] = datetime.timedelta(days=1)
+# Let a fronting proxy (e.g. nginx) serve file bodies via X-Sendfile
+app.use_x_sendfile = os.environ.get('USE_X_SENDFILE', 'false').lower() == 'true'
 
 # Set up file paths
 BASE_PATH = Path(__file__).parent.parent
@@ -71,10 +83,80 @@ os.makedirs(TEMPLATES_PATH, exist_ok=True)
 os.makedirs(PROMPTS_PATH, exist_ok=True)
 os.makedirs(CUSTOM_TEMPLATES_PATH, exist_ok=True)
 
+# In-memory caches of parsed JSON and raw text files, keyed by path and
+# invalidated when the file's mtime or size changes
+_json_cache = {}
+_text_cache = {}
+_file_cache_lock = Lock()
+
+def _load_cached(cache, path, loader):
+    """Return the cached value for a file, reloading it if the file changed."""
+    path = str(path)
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _file_cache_lock:
+        cached = cache.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+    value = loader(path)
+    with _file_cache_lock:
+        cache[path] = (stamp, value)
+    return value
+
+def _read_json(path):
+    if ORJSON_SUPPORT:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def write_text(path, text):
+    """Write a UTF-8 text file."""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+def write_json(path, obj, indent=True):
+    """Write obj as JSON, using orjson's byte encoder when available.
+    
+    Pass indent=False for internal intermediates nobody reads by hand; they
+    are written compactly.
+    """
+    if ORJSON_SUPPORT:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(obj, option=option))
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            if indent:
+                json.dump(obj, f, indent=2, ensure_ascii=False)
+            else:
+                json.dump(obj, f, separators=(',', ':'), ensure_ascii=False)
+
+def _read_text(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def load_json_cached(path):
+    """Load a JSON file, reusing the parsed value while the file is unchanged."""
+    return _load_cached(_json_cache, path, _read_json)
+
+def load_text_cached(path):
+    """Read a text file, reusing the contents while the file is unchanged."""
+    return _load_cached(_text_cache, path, _read_text)
+
+# Background pool for report file writes so they overlap each other and the
+# request's remaining work; callers wait on the futures before responding
+_IO_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix='report-io')
+
+def finish_writes(pending):
+    """Wait for submitted writes and re-raise the first failure, if any."""
+    wait(pending)
+    for future in pending:
+        future.result()
+
 # Load configuration
 CONFIG_PATH = BASE_PATH / "config.json"
-with open(CONFIG_PATH, 'r') as f:
-    CONFIG = json.load(f)
+CONFIG = load_json_cached(CONFIG_PATH)
 
 # Initialize components
 deidentifier = Deidentifier(ref_table_path=Path.home() / Path(CONFIG["paths"]["reference_tables"]))
@@ -84,18 +166,69 @@ claude_api = ClaudeAPIClient(CONFIG_PATH)
 
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'txt', 'md', 'docx', 'pdf'}
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # Bytes copied per read when saving uploads
+VIEW_PREVIEW_BYTES = 256 * 1024  # Larger files are truncated in /view
 REPORT_SECTIONS = CONFIG['report_sections']
 
+# Display titles for the configured sections, computed once at startup
+SECTION_TITLES = {s: s.replace('_', ' ').title() for s in REPORT_SECTIONS}
+SECTION_KEYS = {v: k for k, v in SECTION_TITLES.items()}
+
+def format_section_title(section):
+    """Return the display title for a section key, e.g. medical_history -> Medical History."""
+    title = SECTION_TITLES.get(section)
+    return title if title is not None else section.replace('_', ' ').title()
+
+# Section headings in a draft report (the report title is not a section)
+_SECTION_RE = re.compile(r'(?m)^(# (?!Clinical Assessment Report)[^\n]*)$')
+_SECTION_RE_BYTES = re.compile(_SECTION_RE.pattern.encode())
+
 # Global event queue for streaming activity
 event_queue = Queue()
-event_queue_lock = Lock()
+EVENT_HEARTBEAT_SECONDS = 15  # Idle interval before an SSE keep-alive comment
 
 def log_event(message):
     """Add an event to the queue for streaming"""
-    with event_queue_lock:
-        event_queue.put(f"[{datetime.datetime.now().strftime('%H:%M:%S')}] {message}")
-        # Also log to the console
-        app.logger.info(message)
+    # Queue is internally synchronized, no extra lock needed
+    event_queue.put(f"[{time.strftime('%H:%M:%S')}] {message}")
+    # Also log to the console
+    app.logger.info(message)
+
+def list_ext(path, exts):
+    """Return names of regular files in a directory whose extension is in exts.
+    
+    Uses a single scandir pass; hidden files and names without an extension
+    are skipped, and a missing directory yields an empty list.
+    """
+    try:
+        with os.scandir(path) as entries:
+            return [entry.name for entry in entries
+                    if not entry.name.startswith('.') and '.' in entry.name
+                    and entry.name.rsplit('.', 1)[-1].lower() in exts
+                    and entry.is_file()]
+    except FileNotFoundError:
+        return []
+
+def list_ref_tables(ref_dir):
+    """Return (Path, mtime) pairs for the reference tables in ref_dir."""
+    try:
+        with os.scandir(ref_dir) as entries:
+            return [(Path(entry.path), entry.stat().st_mtime) for entry in entries
+                    if entry.name.startswith('ref_table_') and entry.name.endswith('.json')
+                    and entry.is_file()]
+    except FileNotFoundError:
+        return []
+
+_SAFE_NAME_RE = re.compile(r'[^A-Za-z0-9_.-]+')
+
+def safe_name(name):
+    """Sanitize an admin-supplied prompt/template name for use as a filename.
+    
+    A cheaper stand-in for secure_filename on trusted endpoints: path
+    separators and other unsafe characters become underscores and leading
+    dots are dropped. Uploads still go through secure_filename.
+    """
+    return _SAFE_NAME_RE.sub('_', name).lstrip('.')[:128] or '_'
 
 def allowed_file(filename):
     """Check if a file has an allowed extension."""
@@ -105,26 +238,27 @@ def allowed_file(filename):
 def index():
     """Render the index page with input and output files."""
     # Get input files
-    input_files = [file.name for file in INPUT_PATH.glob('*.*') 
-                   if file.suffix.lower()[1:] in ALLOWED_EXTENSIONS]
+    input_files = list_ext(INPUT_PATH, ALLOWED_EXTENSIONS)
     
     # Get output files
-    output_files = [file.name for file in OUTPUT_PATH.glob('*.*')]
+    with os.scandir(OUTPUT_PATH) as entries:
+        output_files = [entry.name for entry in entries
+                        if '.' in entry.name and not entry.name.startswith('.')]
     
     # Check for reference tables
-    ref_tables = list(Path.home().glob(f"{CONFIG['paths']['reference_tables']}/ref_table_*.json"))
+    ref_tables = list_ref_tables(Path.home() / CONFIG['paths']['reference_tables'])
     
     # Check for draft report
     draft_exists = (OUTPUT_PATH / "draft_report.txt").exists()
     
     # Custom prompts
     if ADMIN_MODE:
-        custom_prompts = [file.name for file in PROMPTS_PATH.glob('*.txt')]
+        custom_prompts = list_ext(PROMPTS_PATH, {'txt'})
     else:
         custom_prompts = []
     
     # Available templates
-    custom_templates = [file.stem for file in CUSTOM_TEMPLATES_PATH.glob('*.json')]
+    custom_templates = [name[:-len('.json')] for name in list_ext(CUSTOM_TEMPLATES_PATH, {'json'})]
     
     return render_template('index.html', 
                           input_files=input_files, 
@@ -153,7 +287,10 @@ def upload_file():
     
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
-        file.save(os.path.join(INPUT_PATH, filename))
+        # Stream the upload straight to disk, creating it owner-only
+        dest = os.open(os.path.join(INPUT_PATH, filename), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(dest, 'wb') as out:
+            shutil.copyfileobj(file.stream, out, UPLOAD_CHUNK_SIZE)
         flash(f'File {filename} uploaded successfully')
         log_event(f"File uploaded: {filename}")
         return redirect(url_for('index'))
@@ -168,8 +305,8 @@ def process_files():
         log_event("Beginning document processing...")
         
         # Get input files
-        input_files = [os.path.join(INPUT_PATH, f) for f in os.listdir(INPUT_PATH) 
-                    if os.path.isfile(os.path.join(INPUT_PATH, f))]
+        with os.scandir(INPUT_PATH) as entries:
+            input_files = [entry.path for entry in entries if entry.is_file()]
         
         if not input_files:
             flash('No input files found')
@@ -188,26 +325,21 @@ def process_files():
         if template_name != 'default':
             template_path = os.path.join(TEMPLATES_PATH, f"{template_name}.txt")
             if os.path.exists(template_path):
-                with open(template_path, 'r', encoding='utf-8') as f:
-                    report_template = f.read()
-                    log_event(f"Loaded template: {template_name}")
+                report_template = load_text_cached(template_path)
+                log_event(f"Loaded template: {template_name}")
         
         if prompt_name:
             prompt_path = os.path.join(TEMPLATES_PATH, 'prompts', f"{prompt_name}.txt")
             if os.path.exists(prompt_path):
-                with open(prompt_path, 'r', encoding='utf-8') as f:
-                    prompt_template = f.read()
-                    log_event(f"Loaded prompt: {prompt_name}")
+                prompt_template = load_text_cached(prompt_path)
+                log_event(f"Loaded prompt: {prompt_name}")
         
         # Process all documents to organize content by section
         log_event("Organizing content from files...")
         organized_content = document_processor.organize_content(input_files)
         
-        # Save organized content for reference
-        with open(os.path.join(OUTPUT_PATH, 'organized_content.json'), 'w', encoding='utf-8') as f:
-            json.dump(organized_content, f, indent=2)
-            
-        log_event("Saved organized content for reference")
+        # Save organized content for reference while the sections are processed
+        pending_writes = [_IO_POOL.submit(write_json, os.path.join(OUTPUT_PATH, 'organized_content.json'), organized_content, False)]
         
         # Process each section with AI enhancement if available
         log_event("Starting report section processing...")
@@ -215,29 +347,22 @@ def process_files():
         
         try:
             # Process all sections at once to leverage our concurrency protection
-            enhanced_content = document_processor.process_documents(input_files, prompt_template, reference_table)
+            enhanced_content = document_processor.process_documents(
+                input_files, prompt_template, reference_table, organized_content=organized_content
+            )
             
             # Generate the report
             log_event("Generating final report...")
             report_content = report_generator.generate_report(enhanced_content, template=report_template)
             
-            # Save draft report
-            draft_path = os.path.join(OUTPUT_PATH, 'draft_report.txt')
-            with open(draft_path, 'w', encoding='utf-8') as f:
-                f.write(report_content)
-                
-            log_event("Saved draft report")
-            
             # Save reference table if available
             ref_table_path = os.path.join(OUTPUT_PATH, 'reference_table.json')
             if reference_table:
-                with open(ref_table_path, 'w', encoding='utf-8') as f:
-                    json.dump(reference_table, f, indent=2)
-                    log_event("Saved reference table")
+                pending_writes.append(_IO_POOL.submit(write_json, ref_table_path, reference_table))
             
             # Store report in session for refinement
             session['report_content'] = enhanced_content
-            session['has_ref_table'] = os.path.exists(ref_table_path)
+            session['has_ref_table'] = bool(reference_table) or os.path.exists(ref_table_path)
             
             flash('Report generated successfully')
             log_event("Report generation complete - ready for review")
@@ -247,22 +372,15 @@ def process_files():
             log_event("Using organized content as fallback...")
             
             # Save the organized content directly
-            with open(os.path.join(OUTPUT_PATH, 'enhanced_content.json'), 'w', encoding='utf-8') as f:
-                json.dump(organized_content, f, indent=2)
+            pending_writes.append(_IO_POOL.submit(write_json, os.path.join(OUTPUT_PATH, 'enhanced_content.json'), organized_content, False))
                 
             # Generate a simple report from the organized content
             simple_report = "# Generated Report\n\n"
             for section_name, content in organized_content.items():
                 if content:
-                    formatted_section = section_name.replace('_', ' ').title()
+                    formatted_section = format_section_title(section_name)
                     simple_report += f"## {formatted_section}\n\n{content}\n\n"
-            
-            # Save simple report
-            draft_path = os.path.join(OUTPUT_PATH, 'draft_report.txt')
-            with open(draft_path, 'w', encoding='utf-8') as f:
-                f.write(simple_report)
-                
-            log_event("Saved simple report as fallback")
+            report_content = simple_report
             
             # Store report in session for refinement
             session['report_content'] = organized_content
@@ -270,7 +388,16 @@ def process_files():
             
             flash('Report generated with basic content (API enhancement failed)')
             log_event("Basic report generation complete")
-            
+        
+        # Save the draft report, whichever way it was generated; a single
+        # write means a failed attempt can never race the fallback
+        draft_path = os.path.join(OUTPUT_PATH, 'draft_report.txt')
+        pending_writes.append(_IO_POOL.submit(write_text, draft_path, report_content))
+        
+        # Make sure every report file is on disk before the user can open it
+        finish_writes(pending_writes)
+        log_event(f"Saved {len(pending_writes)} report files")
+        
         return redirect(url_for('index'))
     except Exception as e:
         error_msg = f"Error processing files: {str(e)}"
@@ -293,31 +420,26 @@ def preview_report():
     # Load organized content if available
     organized_path = OUTPUT_PATH / "organized_content.json"
     if organized_path.exists():
-        with open(organized_path, 'r', encoding='utf-8') as f:
-            original_content = json.load(f)
+        original_content = load_json_cached(organized_path)
     else:
         original_content = {}
     
-    # Extract sections from draft report
+    # Extract sections from draft report, slicing between heading offsets
     sections = {}
-    current_section = "preamble"
-    section_text = []
-    
-    for line in content.split('\n'):
-        if line.startswith('# ') and not line.startswith('# Clinical Assessment Report'):
-            # Save previous section
-            if section_text:
-                sections[current_section] = '\n'.join(section_text)
-            
-            # Start new section
-            current_section = line[2:].lower().replace(' ', '_')
-            section_text = [line]
-        else:
-            section_text.append(line)
+    matches = list(_SECTION_RE.finditer(content))
     
-    # Save last section
-    if section_text:
-        sections[current_section] = '\n'.join(section_text)
+    if not matches:
+        sections["preamble"] = content
+    elif matches[0].start() > 0:
+        sections["preamble"] = content[:matches[0].start() - 1]
+    
+    for i, match in enumerate(matches):
+        if i + 1 < len(matches):
+            # Drop the newline that precedes the next heading
+            section_text = content[match.start():matches[i + 1].start() - 1]
+        else:
+            section_text = content[match.start():]
+        sections[match.group(1)[2:].lower().replace(' ', '_')] = section_text
     
     return render_template('preview_report.html', 
                           content=content,
@@ -325,6 +447,47 @@ def preview_report():
                           original_content=original_content,
                           report_sections=REPORT_SECTIONS)
 
+def patch_section(path, heading, new_content):
+    """Replace one section of a report file in place.
+    
+    The file is scanned through an mmap; only the bytes from the section
+    start onwards are rewritten, the prefix is left untouched on disk.
+    
+    Args:
+        path: Report file to patch
+        heading: Exact heading line of the section, e.g. "# Medical History"
+        new_content: Replacement text, running up to the next section
+    
+    Returns:
+        True if the section was found and replaced, False otherwise
+    """
+    heading = heading.encode('utf-8')
+    section_start = next_section_start = -1
+    
+    with open(path, 'r+b') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return False
+        
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for match in _SECTION_RE_BYTES.finditer(mm):
+                if section_start >= 0:
+                    next_section_start = match.start()
+                    break
+                if match.group(1).rstrip(b'\r') == heading:
+                    section_start = match.start()
+            
+            if section_start < 0:
+                return False
+            
+            # Keep everything from the next section on, or nothing at the end
+            suffix = mm[next_section_start:] if next_section_start >= 0 else b''
+        
+        f.seek(section_start)
+        f.writelines((new_content.encode('utf-8'), suffix))
+        f.truncate()
+    
+    return True
+
 @app.route('/refine_section', methods=['POST'])
 def refine_section():
     """Refine a specific section with Claude API."""
@@ -344,29 +507,9 @@ def refine_section():
             else:
                 enhanced_content = claude_api.generate_narrative(section, content)
             
-            # Update draft report
-            draft_path = OUTPUT_PATH / "draft_report.txt"
-            with open(draft_path, 'r', encoding='utf-8') as f:
-                report_content = f.read()
-            
-            # Replace section in report
-            section_title = section.replace('_', ' ').title()
-            section_pattern = f"# {section_title}\n"
-            section_start = report_content.find(section_pattern)
-            
-            if section_start >= 0:
-                next_section_start = report_content.find("# ", section_start + len(section_pattern))
-                
-                if next_section_start >= 0:
-                    # Replace section until next section
-                    report_content = report_content[:section_start] + enhanced_content + report_content[next_section_start:]
-                else:
-                    # Replace until end of document
-                    report_content = report_content[:section_start] + enhanced_content
-            
-            # Save updated draft
-            with open(draft_path, 'w', encoding='utf-8') as f:
-                f.write(report_content)
+            # Replace section in the draft report
+            section_title = format_section_title(section)
+            patch_section(OUTPUT_PATH / "draft_report.txt", f"# {section_title}", enhanced_content)
             
             flash(f'Section "{section_title}" refined successfully')
         else:
@@ -452,32 +595,32 @@ def export_to_word(content, output_path):
     style.font.name = 'Calibri'
     style.font.size = Pt(11)
     
+    # Heading styles are shared, so configure them once up front
+    for level, size in ((1, 16), (2, 14), (3, 12)):
+        heading_style = doc.styles[f'Heading {level}']
+        heading_style.font.size = Pt(size)
+        heading_style.font.bold = True
+    
     # Process the content line by line
     lines = content.split('\n')
+    body = doc.element.body
     current_para = None
     
     for line in lines:
-        if line.startswith('# '):
-            # Heading 1
-            heading = doc.add_heading(line[2:], level=1)
-            heading.style.font.size = Pt(16)
-            heading.style.font.bold = True
-        elif line.startswith('## '):
-            # Heading 2
-            heading = doc.add_heading(line[3:], level=2)
-            heading.style.font.size = Pt(14)
-            heading.style.font.bold = True
-        elif line.startswith('### '):
-            # Heading 3
-            heading = doc.add_heading(line[4:], level=3)
-            heading.style.font.size = Pt(12)
-            heading.style.font.bold = True
+        # Markdown heading depth: number of leading '#' followed by a space
+        depth = len(line) - len(line.lstrip('#')) if line[:1] == '#' else 0
+        
+        if 0 < depth <= 3 and line[depth:depth + 1] == ' ':
+            # Heading 1-3
+            doc.add_heading(line[depth + 1:], level=depth)
         elif not line.strip():
             # Empty line
             current_para = None
         else:
-            # Regular paragraph
-            current_para = doc.add_paragraph(line)
+            # Regular paragraph, appended as raw <w:p><w:r> without the
+            # Paragraph proxy and style lookup of add_paragraph
+            current_para = body.add_p()
+            current_para.add_r().text = line
             
     # Add footer
     section = doc.sections[0]
@@ -493,7 +636,9 @@ def export_to_word(content, output_path):
 @app.route('/download/<filename>')
 def download_file(filename):
     """Download a file from the output directory."""
-    return send_from_directory(OUTPUT_PATH, filename)
+    # Conditional responses give 304s for unchanged files and honour Range
+    return send_from_directory(OUTPUT_PATH, filename, as_attachment=True,
+                               conditional=True, etag=True, max_age=0)
 
 @app.route('/view/<filename>')
 def view_file(filename):
@@ -504,27 +649,33 @@ def view_file(filename):
         flash(f'File {filename} not found')
         return redirect(url_for('index'))
     
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
+    # Only render a preview of large files; the full file is a download away
+    with open(file_path, 'rb') as f:
+        data = f.read(VIEW_PREVIEW_BYTES + 1)
+    truncated = len(data) > VIEW_PREVIEW_BYTES
+    if truncated:
+        # Drop any multi-byte character split at the cut
+        content = data[:VIEW_PREVIEW_BYTES].decode('utf-8', errors='ignore')
+    else:
+        content = data.decode('utf-8')
     
-    return render_template('view.html', filename=filename, content=content)
+    return render_template('view.html', filename=filename, content=content, truncated=truncated)
 
 @app.route('/view_reference_table')
 def view_reference_table():
     """View the reference table that maps placeholders to original values."""
     ref_table_path = Path.home() / Path(CONFIG["paths"]["reference_tables"])
-    ref_tables = list(ref_table_path.glob("ref_table_*.json"))
+    ref_tables = list_ref_tables(ref_table_path)
     
     if not ref_tables:
         flash('No reference table found')
         return redirect(url_for('index'))
     
     # Get the most recent reference table
-    latest_ref_table = max(ref_tables, key=os.path.getmtime)
+    latest_ref_table = max(ref_tables, key=lambda item: item[1])[0]
     
     try:
-        with open(latest_ref_table, 'r') as f:
-            ref_table = json.load(f)
+        ref_table = load_json_cached(latest_ref_table)
         
         # Organize by PHI type
         organized_table = {}
@@ -549,7 +700,8 @@ def prompt_lab():
         return redirect(url_for('index'))
     
     prompts = []
-    for file_path in PROMPTS_PATH.glob('*.txt'):
+    for name in list_ext(PROMPTS_PATH, {'txt'}):
+        file_path = PROMPTS_PATH / name
         with open(file_path, 'r', encoding='utf-8') as f:
             content = f.read()
         prompts.append({
@@ -574,7 +726,7 @@ def save_prompt():
         return redirect(url_for('prompt_lab'))
     
     # Sanitize filename
-    filename = secure_filename(f"{name}.txt")
+    filename = f"{safe_name(name)}.txt"
     
     # Save prompt
     prompt_path = PROMPTS_PATH / filename
@@ -592,7 +744,7 @@ def delete_prompt(name):
         return redirect(url_for('index'))
     
     # Sanitize filename
-    filename = secure_filename(f"{name}.txt")
+    filename = f"{safe_name(name)}.txt"
     
     # Delete prompt
     prompt_path = PROMPTS_PATH / filename
@@ -607,13 +759,14 @@ def delete_prompt(name):
 @app.route('/clear_input')
 def clear_input():
     """Clear all files from the input directory."""
-    for filename in os.listdir(INPUT_PATH):
-        file_path = os.path.join(INPUT_PATH, filename)
-        try:
-            if os.path.isfile(file_path):
-                os.unlink(file_path)
-        except Exception as e:
-            flash(f'Error deleting {filename}: {e}')
+    with os.scandir(INPUT_PATH) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            try:
+                os.unlink(entry.path)
+            except OSError as e:
+                flash(f'Error deleting {entry.name}: {e}')
     
     flash('Input files cleared')
     log_event("All input files cleared")
@@ -622,13 +775,14 @@ def clear_input():
 @app.route('/clear_output')
 def clear_output():
     """Clear all files from the output directory."""
-    for filename in os.listdir(OUTPUT_PATH):
-        file_path = os.path.join(OUTPUT_PATH, filename)
-        try:
-            if os.path.isfile(file_path):
-                os.unlink(file_path)
-        except Exception as e:
-            flash(f'Error deleting {filename}: {e}')
+    with os.scandir(OUTPUT_PATH) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            try:
+                os.unlink(entry.path)
+            except OSError as e:
+                flash(f'Error deleting {entry.name}: {e}')
     
     flash('Output files cleared')
     log_event("All output files cleared")
@@ -647,41 +801,46 @@ def toggle_offline_mode():
     
     return redirect(url_for('index'))
 
+def load_default_templates(sections):
+    """Return the default template text for each section.
+    
+    Section files come from the mtime-checked text cache, so unchanged files
+    are not re-read; sections without a file get a bare heading template.
+    """
+    default_templates = {}
+    for section in sections:
+        template_path = TEMPLATES_PATH / f"{section}.txt"
+        try:
+            default_templates[section] = load_text_cached(template_path)
+        except FileNotFoundError:
+            default_templates[section] = f"# {format_section_title(section)}\n\n{{content}}\n\n"
+    return default_templates
+
 @app.route('/template_manager')
 def template_manager():
     """Interface for managing report templates."""
     # Get existing custom templates
     templates = []
-    for file_path in CUSTOM_TEMPLATES_PATH.glob('*.json'):
+    for name in list_ext(CUSTOM_TEMPLATES_PATH, {'json'}):
+        file_path = CUSTOM_TEMPLATES_PATH / name
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                template_data = json.load(f)
-                templates.append({
-                    'name': file_path.stem,
-                    'description': template_data.get('description', 'No description provided'),
-                    'created': template_data.get('created_date', 'Unknown'),
-                    'sections': len(template_data.get('sections', {}))
-                })
+            template_data = load_json_cached(file_path)
+            templates.append({
+                'name': file_path.stem,
+                'description': template_data.get('description', 'No description provided'),
+                'created': template_data.get('created_date', 'Unknown'),
+                'sections': len(template_data.get('sections', {}))
+            })
         except Exception as e:
             print(f"Error loading template {file_path.name}: {str(e)}")
     
     # Get section names from config
     all_sections = CONFIG['report_sections']
     
-    # Load default template examples
-    default_templates = {}
-    for section in all_sections:
-        template_path = TEMPLATES_PATH / f"{section}.txt"
-        if template_path.exists():
-            with open(template_path, 'r', encoding='utf-8') as f:
-                default_templates[section] = f.read()
-        else:
-            default_templates[section] = f"# {section.replace('_', ' ').title()}\n\n{{content}}\n\n"
-    
     return render_template('template_manager.html',
                           templates=templates,
                           sections=all_sections,
-                          default_templates=default_templates)
+                          default_templates=load_default_templates(all_sections))
 
 @app.route('/create_template', methods=['POST'])
 def create_template():
@@ -694,7 +853,7 @@ def create_template():
         return redirect(url_for('template_manager'))
     
     # Sanitize template name
-    template_name = secure_filename(template_name).replace('.json', '')
+    template_name = safe_name(template_name).replace('.json', '')
     
     # Create template structure
     template_data = {
@@ -719,8 +878,7 @@ def create_template():
     
     # Save template
     template_path = CUSTOM_TEMPLATES_PATH / f"{template_name}.json"
-    with open(template_path, 'w', encoding='utf-8') as f:
-        json.dump(template_data, f, indent=2)
+    write_json(template_path, template_data)
     
     flash(f'Template "{template_name}" saved successfully')
     return redirect(url_for('template_manager'))
@@ -735,8 +893,7 @@ def edit_template(name):
         return redirect(url_for('template_manager'))
     
     try:
-        with open(template_path, 'r', encoding='utf-8') as f:
-            template_data = json.load(f)
+        template_data = load_json_cached(template_path)
     except Exception as e:
         flash(f'Error loading template: {str(e)}')
         return redirect(url_for('template_manager'))
@@ -744,25 +901,15 @@ def edit_template(name):
     # Get section names from config
     all_sections = CONFIG['report_sections']
     
-    # Load default template examples
-    default_templates = {}
-    for section in all_sections:
-        section_template_path = TEMPLATES_PATH / f"{section}.txt"
-        if section_template_path.exists():
-            with open(section_template_path, 'r', encoding='utf-8') as f:
-                default_templates[section] = f.read()
-        else:
-            default_templates[section] = f"# {section.replace('_', ' ').title()}\n\n{{content}}\n\n"
-    
     return render_template('edit_template.html',
                           template=template_data,
                           sections=all_sections,
-                          default_templates=default_templates)
+                          default_templates=load_default_templates(all_sections))
 
 @app.route('/delete_template/<name>')
 def delete_template(name):
     """Delete a template."""
-    template_path = CUSTOM_TEMPLATES_PATH / f"{name}.json"
+    template_path = CUSTOM_TEMPLATES_PATH / f"{safe_name(name)}.json"
     
     if template_path.exists():
         os.remove(template_path)
@@ -782,60 +929,30 @@ def event_stream():
         
         while True:
             try:
-                # Try to get a message from the queue with a timeout
-                message = event_queue.get(timeout=0.5)
-                yield f"data: {message}\n\n"
-                event_queue.task_done()
+                # Block until a message arrives or the heartbeat interval passes
+                message = event_queue.get(timeout=EVENT_HEARTBEAT_SECONDS)
             except Empty:
                 # If nothing in the queue, send a heartbeat comment to keep connection alive
                 yield ": heartbeat\n\n"
-                time.sleep(0.5)
+                continue
+            
+            # Drain anything else already queued so bursts go out in one flush
+            events = [f"data: {message}\n\n"]
+            event_queue.task_done()
+            while True:
+                try:
+                    message = event_queue.get_nowait()
+                except Empty:
+                    break
+                events.append(f"data: {message}\n\n")
+                event_queue.task_done()
+            yield ''.join(events)
                 
     return Response(generate(), mimetype='text/event-stream')
 
-# Monkey patch the Claude API client to log events
-original_generate_narrative = claude_api.generate_narrative
-
-def generate_narrative_with_logging(self, section_name, content):
-    """Wrapper to add logging to the generate_narrative method"""
-    formatted_section = section_name.replace('_', ' ').title()
-    log_event(f"Starting processing of {formatted_section}")
-    result = original_generate_narrative(self, section_name, content)
-    log_event(f"Completed processing of {formatted_section}")
-    return result
-
-claude_api.generate_narrative = generate_narrative_with_logging.__get__(claude_api, type(claude_api))
-
-# Monkey patch ClaudeAPIClient._apply_rate_limiting to log rate limit events
-original_apply_rate_limiting = claude_api._apply_rate_limiting
-
-def apply_rate_limiting_with_logging(self):
-    """Wrapper to add logging to the _apply_rate_limiting method"""
-    current_time = time.time()
-    elapsed = current_time - self.last_request_time
-    
-    if elapsed < self.min_request_interval:
-        wait_time = max(0, self.min_request_interval - elapsed)
-        if wait_time > 0.1:  # Only log if waiting more than 0.1 seconds
-            log_event(f"API rate limiting: Waiting {wait_time:.1f} seconds")
-            time.sleep(wait_time)
-    
-claude_api._apply_rate_limiting = apply_rate_limiting_with_logging.__get__(claude_api, type(claude_api))
-
-# Monkey patch the _call_claude_api method to log API requests
-original_call_claude_api = claude_api._call_claude_api
-
-def call_claude_api_with_logging(self, prompt, section_identifier):
-    """Wrapper to add logging to the _call_claude_api method"""
-    log_event(f"Sending API request for {section_identifier}")
-    result = original_call_claude_api(self, prompt, section_identifier)
-    if result:
-        log_event(f"API request successful for {section_identifier}")
-    else:
-        log_event(f"API request failed for {section_identifier}")
-    return result
-
-claude_api._call_claude_api = call_claude_api_with_logging.__get__(claude_api, type(claude_api))
+# Report Claude API activity (narratives, requests, rate-limit waits) to the
+# activity console
+claude_api.on_event = log_event
 
 if __name__ == '__main__':
     app.run(debug=False, port=5000) 
\ No newline at end of file
@@ -0,0 +1,25 @@
+"""
+Delilah Prime - Configuration Module
+
+This module loads config.json once per process for the API client, document
+processor and report generator.
+"""
+
+import json
+import functools
+from types import MappingProxyType
+
+
+@functools.lru_cache(maxsize=4)
+def load_config(config_path):
+    """
+    Load and parse a configuration file once per path.
+    
+    Args:
+        config_path: Path to configuration file, as a string
+        
+    Returns:
+        Read-only mapping of the configuration
+    """
+    with open(config_path, 'r') as f:
+        return MappingProxyType(json.load(f))
@@ -6,18 +6,152 @@ It creates a secure local reference table for re-identification during final rep
 """
 
 import re
-import uuid
 import json
 import os
+import copy
+import functools
 from datetime import datetime
 from pathlib import Path
 
+# Fast JSON serialization when orjson is available
+try:
+    import orjson
+    ORJSON_SUPPORT = True
+except ImportError:
+    ORJSON_SUPPORT = False
+
+# Multi-keyword matching for the professional-term whitelist
+try:
+    import ahocorasick
+    AHOCORASICK_SUPPORT = True
+except ImportError:
+    AHOCORASICK_SUPPORT = False
+
+# Placeholder suffixes drawn per os.urandom call
+PLACEHOLDER_TOKEN_BATCH = 256
+
+# Non-ASCII characters that re.IGNORECASE matches to an ASCII letter but
+# str.lower() leaves alone; folded before the literal-anchor prefilter
+_ANCHOR_FOLD = str.maketrans({'\u0131': 'i', '\u017f': 's'})
+
+# Placeholders produced by Deidentifier._generate_placeholder, e.g. [NAME_1a2b3c4d]
+PLACEHOLDER_RE = re.compile(r"\[[A-Z_]+_[0-9a-f]{8}\]")
+
+
+def _substitute_placeholders(text, ref_table):
+    """Replace every known placeholder in text with its original value in one pass."""
+    if not ref_table:
+        return text
+    return PLACEHOLDER_RE.sub(lambda m: ref_table.get(m.group(0), m.group(0)), text)
+
+
+def _build_term_automaton(terms):
+    """Build an Aho-Corasick automaton that finds any of the given terms."""
+    automaton = ahocorasick.Automaton()
+    for term in terms:
+        automaton.add_word(term, True)
+    automaton.make_automaton()
+    return automaton
+
 
 class Deidentifier:
     """
     Handles the de-identification of personal health information (PHI) in documents.
+    
+    The patterns and professional-term matcher are class-level and shared by
+    all instances; an instance only holds its session's reference table.
     """
     
+    # Define regex patterns for PHI detection - specifically for OT reports
+    patterns = {
+        # Names - Focus on patient name patterns with both titles and full names in context
+        "NAME": [
+            # Client/patient with title (most common in OT reports)
+            r"\b(?:Mr\.|Mrs\.|Ms\.|Dr\.|Prof\.)\s[A-Z][a-z]+(?:\s[A-Z][a-z]+)*\b",
+            
+            # Full names in specific contexts often found in OT reports
+            r"\b(?:patient|client|individual|subject)\s(?:name|is):\s*[A-Z][a-z]+(?:\s[A-Z][a-z]+)+\b",
+            r"\b(?:name|patient|client):\s*[A-Z][a-z]+(?:\s[A-Z][a-z]+)+\b",
+            
+            # Patient full name pattern (First Last) at beginning of sentence or after period - fixed width lookbehind
+            r"(?:\.\s+|\n\s*|^\s*)[A-Z][a-z]+\s+[A-Z][a-z]+\s+(?:was|is|has|had|will|received|underwent|reported)",
+            
+            # Full name pattern before "date of birth" - no lookbehind
+            r"[A-Z][a-z]+\s+[A-Z][a-z]+\s+(?=date of birth|DOB|born on)",
+        ],
+        
+        # Dates - typical medical date formats
+        "DATE": [
+            r"\b(?:DOB|Date\sof\sBirth|Birth\sDate):\s*\d{1,2}[-/\.]\d{1,2}[-/\.]\d{2,4}\b",  # DOB: MM/DD/YYYY
+            r"\b(?:Assessment\sDate|Evaluation\sDate|Date\sof\sAssessment|Date\sof\sEvaluation):\s*\d{1,2}[-/\.]\d{1,2}[-/\.]\d{2,4}\b",  # Assessment Date: MM/DD/YYYY
+            r"\b(?:Date\sof\sLoss|Accident\sDate|Injury\sDate):\s*\d{1,2}[-/\.]\d{1,2}[-/\.]\d{2,4}\b",  # Date of Loss: MM/DD/YYYY
+        ],
+        
+        # Phone numbers
+        "PHONE": [
+            r"\b(?:Phone|Tel|Telephone|Cell|Mobile|Contact)(?:\s#|\s[Nn]umber|\s[Nn]o\.)?:\s*(?:\+\d{1,2}\s)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}\b"  # Phone: (123) 456-7890
+        ],
+        
+        # Identifiers like claim numbers, file numbers that need protection
+        "ID_NUMBER": [
+            r"\b(?:Claim\s(?:No\.|Number)|File\s(?:No\.|Number)):\s*[A-Z0-9-]{5,}(?!\w)",  # Claim No: ABC12345
+            r"\b(?:MRN|Medical\sRecord\s(?:Number|No\.)|Patient\sID|Record\s#):\s*[A-Z0-9-]{5,}(?!\w)",  # MRN: 12345678
+        ],
+    }
+    
+    # Lowercase literals each pattern needs at least one of, parallel to
+    # patterns; a pattern is skipped when none occur in the text. None means
+    # the pattern has no useful anchor and always runs.
+    pattern_anchors = {
+        "NAME": [
+            ("mr.", "mrs.", "ms.", "dr.", "prof."),
+            ("patient", "client", "individual", "subject"),
+            ("name", "patient", "client"),
+            None,
+            ("date of birth", "dob", "born on"),
+        ],
+        "DATE": [
+            ("dob", "date"),
+            ("date",),
+            ("date",),
+        ],
+        "PHONE": [
+            ("phone", "tel", "cell", "mobile", "contact"),
+        ],
+        "ID_NUMBER": [
+            ("claim", "file"),
+            ("mrn", "medical", "patient", "record"),
+        ],
+    }
+    
+    # Compiled once per process and shared by every instance; patterns keeps
+    # the source strings for debugging
+    compiled_patterns = {
+        phi_type: [re.compile(pattern, re.IGNORECASE) for pattern in phi_patterns]
+        for phi_type, phi_patterns in patterns.items()
+    }
+    
+    # Professional terms that should NOT be identified as PHI
+    professional_terms = [
+        "Occupational Therapist", "OT Reg", "Health Professional", "Rehabilitation",
+        "Sebastien Ferland", "Neusy Pierre", "Assessment", "Therapy", "Evaluation",
+        "Clinical", "Functional", "Physical", "Cognitive", "Emotional", "Psychological",
+        "Montreal Cognitive Assessment", "Patient Health Questionnaire",
+        "AMA Guides", "Activities of Daily Living", "Functional Capacity Evaluation",
+        "Glasgow Outcome Scale", "Extended", "Report", "Documentation", "Mobility",
+        "Independence", "Function", "Adaptability", "Concentration", "Persistence", "Pace",
+        "Deterioration", "Decompensation", "Work Settings", "Social Functioning",
+        "Vocational", "Capital", "Associates", "Specialists", "Baseline Road", "Ottawa"
+    ]
+    
+    # Build the whitelist matcher once; each check is then a single scan.
+    # Without pyahocorasick, a compiled alternation of the terms is used.
+    _prof_lower = tuple(term.lower() for term in professional_terms)
+    if AHOCORASICK_SUPPORT:
+        _prof_ac = _build_term_automaton(_prof_lower)
+    else:
+        _prof_re = re.compile('|'.join(map(re.escape, sorted(_prof_lower, key=len, reverse=True))))
+    
     def __init__(self, ref_table_path=None):
         """
         Initialize the de-identification system.
@@ -37,73 +171,58 @@ class Deidentifier:
         # Initialize reference table for this session
         self.session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
         self.reference_table = {}
+        self._token_pool = []
+    
+    def new_session(self):
+        """
+        Start a new de-identification session without rebuilding the matchers.
         
-        # Define regex patterns for PHI detection - specifically for OT reports
-        self.patterns = {
-            # Names - Focus on patient name patterns with both titles and full names in context
-            "NAME": [
-                # Client/patient with title (most common in OT reports)
-                r"(?<!\w)(?:Mr\.|Mrs\.|Ms\.|Dr\.|Prof\.)\s[A-Z][a-z]+(?:\s[A-Z][a-z]+)*(?!\w)",
-                
-                # Full names in specific contexts often found in OT reports
-                r"(?<!\w)(?:patient|client|individual|subject)\s(?:name|is):\s*[A-Z][a-z]+(?:\s[A-Z][a-z]+)+(?!\w)",
-                r"(?<!\w)(?:name|patient|client):\s*[A-Z][a-z]+(?:\s[A-Z][a-z]+)+(?!\w)",
-                
-                # Patient full name pattern (First Last) at beginning of sentence or after period - fixed width lookbehind
-                r"(?:\.\s+|\n\s*|^\s*)[A-Z][a-z]+\s+[A-Z][a-z]+\s+(?:was|is|has|had|will|received|underwent|reported)",
-                
-                # Full name pattern before "date of birth" - no lookbehind
-                r"[A-Z][a-z]+\s+[A-Z][a-z]+\s+(?=date of birth|DOB|born on)",
-            ],
-            
-            # Dates - typical medical date formats
-            "DATE": [
-                r"(?<!\w)(?:DOB|Date\sof\sBirth|Birth\sDate):\s*\d{1,2}[-/\.]\d{1,2}[-/\.]\d{2,4}(?!\w)",  # DOB: MM/DD/YYYY
-                r"(?<!\w)(?:Assessment\sDate|Evaluation\sDate|Date\sof\sAssessment|Date\sof\sEvaluation):\s*\d{1,2}[-/\.]\d{1,2}[-/\.]\d{2,4}(?!\w)",  # Assessment Date: MM/DD/YYYY
-                r"(?<!\w)(?:Date\sof\sLoss|Accident\sDate|Injury\sDate):\s*\d{1,2}[-/\.]\d{1,2}[-/\.]\d{2,4}(?!\w)",  # Date of Loss: MM/DD/YYYY
-            ],
-            
-            # Phone numbers
-            "PHONE": [
-                r"(?<!\w)(?:Phone|Tel|Telephone|Cell|Mobile|Contact)(?:\s#|\s[Nn]umber|\s[Nn]o\.)?:\s*(?:\+\d{1,2}\s)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}(?!\w)"  # Phone: (123) 456-7890
-            ],
-            
-            # Identifiers like claim numbers, file numbers that need protection
-            "ID_NUMBER": [
-                r"(?<!\w)(?:Claim\s(?:No\.|Number)|File\s(?:No\.|Number)):\s*[A-Z0-9-]{5,}(?!\w)",  # Claim No: ABC12345
-                r"(?<!\w)(?:MRN|Medical\sRecord\s(?:Number|No\.)|Patient\sID|Record\s#):\s*[A-Z0-9-]{5,}(?!\w)",  # MRN: 12345678
-            ],
-        }
-        
-        # Professional terms that should NOT be identified as PHI
-        self.professional_terms = [
-            "Occupational Therapist", "OT Reg", "Health Professional", "Rehabilitation",
-            "Sebastien Ferland", "Neusy Pierre", "Assessment", "Therapy", "Evaluation",
-            "Clinical", "Functional", "Physical", "Cognitive", "Emotional", "Psychological",
-            "Montreal Cognitive Assessment", "Patient Health Questionnaire",
-            "AMA Guides", "Activities of Daily Living", "Functional Capacity Evaluation",
-            "Glasgow Outcome Scale", "Extended", "Report", "Documentation", "Mobility",
-            "Independence", "Function", "Adaptability", "Concentration", "Persistence", "Pace",
-            "Deterioration", "Decompensation", "Work Settings", "Social Functioning",
-            "Vocational", "Capital", "Associates", "Specialists", "Baseline Road", "Ottawa"
-        ]
+        Returns:
+            A Deidentifier for the same reference table directory, with its
+            own session ID and an empty reference table
+        """
+        session = copy.copy(self)
+        session.session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        session.reference_table = {}
+        session._token_pool = []
+        return session
+    
+    def _next_token(self):
+        """Return a random 8-hex-digit placeholder suffix, refilling the pool in batches."""
+        if not self._token_pool:
+            buf = os.urandom(4 * PLACEHOLDER_TOKEN_BATCH).hex()
+            self._token_pool = [buf[i:i + 8] for i in range(0, len(buf), 8)]
+        return self._token_pool.pop()
     
     def _generate_placeholder(self, phi_type):
         """Generate a unique placeholder for a specific type of PHI."""
-        placeholder_id = str(uuid.uuid4())[:8]
-        return f"[{phi_type}_{placeholder_id}]"
+        return f"[{phi_type}_{self._next_token()}]"
     
     def _is_professional_term(self, text):
         """Check if the text is a professional term that should not be identified as PHI."""
-        # Convert to lowercase for case-insensitive comparison
-        text_lower = text.lower().strip()
+        # Lowercase once for case-insensitive comparison; stripping is not
+        # needed for a substring test
+        text_lower = text.lower()
         
-        # Check if it's in our list of professional terms
-        for term in self.professional_terms:
-            if term.lower() in text_lower:
-                return True
-                
-        return False
+        if AHOCORASICK_SUPPORT:
+            return next(self._prof_ac.iter(text_lower), None) is not None
+        
+        # Check if any of our professional terms occurs in the text
+        return self._prof_re.search(text_lower) is not None
+    
+    def _replace_phi(self, phi_type, match):
+        """Return the placeholder for a PHI match, recording it in the reference table."""
+        phi_value = match.group(0)
+        
+        # Skip if this is a professional term that should not be identified as PHI
+        if self._is_professional_term(phi_value):
+            return phi_value
+        
+        placeholder = self._generate_placeholder(phi_type)
+        
+        # Store the mapping
+        self.reference_table[placeholder] = phi_value
+        return placeholder
     
     def deidentify_text(self, text):
         """
@@ -116,32 +235,27 @@ class Deidentifier:
             De-identified text with PHI replaced by placeholders
         """
         deidentified_text = text
+        text_lower = None
         
         # Process each PHI type
-        for phi_type, patterns in self.patterns.items():
-            # Process each pattern for this PHI type
-            for pattern in patterns:
-                # Find all matches
-                matches = re.finditer(pattern, deidentified_text, re.IGNORECASE)
-                
-                # Replace each match with a placeholder
-                # We process in reverse order to avoid changing the positions of subsequent matches
-                matches = list(matches)
-                for match in reversed(matches):
-                    phi_value = match.group(0)
-                    
-                    # Skip if this is a professional term that should not be identified as PHI
-                    if self._is_professional_term(phi_value):
+        for phi_type, patterns in self.compiled_patterns.items():
+            replace_phi = functools.partial(self._replace_phi, phi_type)
+            
+            # Each pattern rebuilds the text in a single pass; patterns still run
+            # in order so later ones see the placeholders from earlier ones
+            for pattern, anchors in zip(patterns, self.pattern_anchors[phi_type]):
+                if anchors:
+                    # Cheap substring prefilter before the regex scan
+                    if text_lower is None:
+                        text_lower = deidentified_text.lower()
+                        if not text_lower.isascii():
+                            text_lower = text_lower.translate(_ANCHOR_FOLD)
+                    if not any(anchor in text_lower for anchor in anchors):
                         continue
-                    
-                    placeholder = self._generate_placeholder(phi_type)
-                    
-                    # Store the mapping
-                    self.reference_table[placeholder] = phi_value
-                    
-                    # Replace in the text
-                    start, end = match.span()
-                    deidentified_text = deidentified_text[:start] + placeholder + deidentified_text[end:]
+                
+                deidentified_text, replaced = pattern.subn(replace_phi, deidentified_text)
+                if replaced:
+                    text_lower = None
         
         return deidentified_text
     
@@ -155,13 +269,8 @@ class Deidentifier:
         Returns:
             Re-identified text with original PHI values
         """
-        reidentified_text = text
-        
         # Replace each placeholder with its original value
-        for placeholder, original in self.reference_table.items():
-            reidentified_text = reidentified_text.replace(placeholder, original)
-        
-        return reidentified_text
+        return _substitute_placeholders(text, self.reference_table)
     
     def save_reference_table(self):
         """
@@ -172,8 +281,12 @@ class Deidentifier:
         """
         ref_table_file = self.ref_table_path / f"ref_table_{self.session_id}.json"
         
-        with open(ref_table_file, 'w') as f:
-            json.dump(self.reference_table, f, indent=2)
+        if ORJSON_SUPPORT:
+            with open(ref_table_file, 'wb') as f:
+                f.write(orjson.dumps(self.reference_table, option=orjson.OPT_INDENT_2))
+        else:
+            with open(ref_table_file, 'w', encoding='utf-8') as f:
+                json.dump(self.reference_table, f, indent=2)
         
         return ref_table_file
     
@@ -188,9 +301,14 @@ class Deidentifier:
             True if successful, False otherwise
         """
         try:
-            with open(ref_table_file, 'r') as f:
-                self.reference_table = json.load(f)
+            if ORJSON_SUPPORT:
+                with open(ref_table_file, 'rb') as f:
+                    self.reference_table = orjson.loads(f.read())
+            else:
+                with open(ref_table_file, 'r', encoding='utf-8') as f:
+                    self.reference_table = json.load(f)
             return True
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError
         except (FileNotFoundError, json.JSONDecodeError):
             return False
             
@@ -219,23 +337,16 @@ class Deidentifier:
         
         # If content is a string, reidentify directly
         if isinstance(content, str):
-            reidentified = content
-            for placeholder, original in ref_table.items():
-                reidentified = reidentified.replace(placeholder, original)
-            return reidentified
+            return _substitute_placeholders(content, ref_table)
         
         # If content is a dictionary (e.g., sections), reidentify each value
         elif isinstance(content, dict):
-            reidentified = {}
-            for key, value in content.items():
-                if isinstance(value, str):
-                    reidentified_value = value
-                    for placeholder, original in ref_table.items():
-                        reidentified_value = reidentified_value.replace(placeholder, original)
-                    reidentified[key] = reidentified_value
-                else:
-                    reidentified[key] = value
-            return reidentified
+            if not ref_table:
+                return dict(content)
+            return {
+                key: _substitute_placeholders(value, ref_table) if isinstance(value, str) else value
+                for key, value in content.items()
+            }
         
         # Return original content if not a string or dictionary
         return content
@@ -10,18 +10,31 @@ import os
 import json
 import argparse
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from dotenv import load_dotenv
 
+# Fast JSON parsing when orjson is available
+try:
+    import orjson
+    ORJSON_SUPPORT = True
+except ImportError:
+    ORJSON_SUPPORT = False
+
 # Make sure we can import from sibling directories
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import Delilah modules
-from src.deidentifier.deidentifier import Deidentifier
 from src.api.claude_api import ClaudeAPIClient
-from src.processor.document_processor import DocumentProcessor
+from src.processor.document_processor import DocumentProcessor, deidentify_file, get_deidentifier
 from src.processor.report_generator import ReportGenerator
 
+# Buffer size for report/document writes, so large outputs go out in few syscalls
+WRITE_BUFFER_SIZE = 1 << 20
+
+# Input document types picked up by process_input_directory
+INPUT_SUFFIXES = frozenset({".txt", ".md", ".docx", ".pdf"})
+
 
 class DelilahPrime:
     """Main application class for Delilah Prime."""
@@ -40,8 +53,11 @@ class DelilahPrime:
         if config_path is None:
             config_path = Path(__file__).parent.parent / "config.json"
         
-        with open(config_path, 'r') as f:
-            self.config = json.load(f)
+        if ORJSON_SUPPORT:
+            self.config = orjson.loads(Path(config_path).read_bytes())
+        else:
+            with open(config_path, 'r') as f:
+                self.config = json.load(f)
         
         # Set up paths
         self.base_path = Path(__file__).parent.parent
@@ -50,9 +66,9 @@ class DelilahPrime:
         self.templates_path = self.base_path / self.config["paths"]["templates_directory"]
         
         # Initialize components
-        self.deidentifier = Deidentifier(
-            ref_table_path=Path.home() / Path(self.config["paths"]["reference_tables"])
-        )
+        self.deidentifier = get_deidentifier(
+            str(Path.home() / Path(self.config["paths"]["reference_tables"]))
+        ).new_session()
         self.document_processor = DocumentProcessor(config_path)
         self.report_generator = ReportGenerator(config_path)
         self.claude_api = ClaudeAPIClient(config_path)
@@ -80,14 +96,17 @@ class DelilahPrime:
         # De-identify the content
         deidentified_content = self.deidentifier.deidentify_text(content)
         
-        # Save a temporary de-identified version for inspection
+        self._save_deidentified(document_path, deidentified_content)
+        
+        return deidentified_content
+    
+    def _save_deidentified(self, document_path, deidentified_content):
+        """Save a temporary de-identified version of a document for inspection."""
         deidentified_path = self.output_path / f"deidentified_{Path(document_path).name}"
-        with open(deidentified_path, 'w', encoding='utf-8') as f:
+        with open(deidentified_path, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as f:
             f.write(deidentified_content)
         
         print(f"De-identified content saved to {deidentified_path}")
-        
-        return deidentified_content
     
     def process_input_directory(self):
         """
@@ -98,11 +117,31 @@ class DelilahPrime:
         """
         processed_documents = {}
         
-        # Process each file in the input directory
-        for file_path in self.input_path.glob("*.*"):
-            if file_path.suffix.lower() in [".txt", ".md", ".docx", ".pdf"]:
-                print(f"Processing {file_path}")
-                processed_documents[file_path.name] = self.process_document(file_path)
+        # Collect the files to process from the input directory
+        with os.scandir(self.input_path) as entries:
+            file_paths = [
+                Path(entry.path) for entry in entries
+                if entry.is_file() and os.path.splitext(entry.name)[1].lower() in INPUT_SUFFIXES
+            ]
+        
+        if len(file_paths) == 1:
+            print(f"Processing {file_paths[0]}")
+            processed_documents[file_paths[0].name] = self.process_document(file_paths[0])
+        elif file_paths:
+            # Extraction and de-identification are CPU-bound and independent per
+            # file, so fan them out across processes and merge the tables here
+            ref_table_path = str(self.deidentifier.ref_table_path)
+            with ProcessPoolExecutor(max_workers=min(len(file_paths), os.cpu_count() or 1)) as executor:
+                futures = [
+                    executor.submit(deidentify_file, file_path, ref_table_path)
+                    for file_path in file_paths
+                ]
+                for file_path, future in zip(file_paths, futures):
+                    print(f"Processing {file_path}")
+                    deidentified_content, reference_table = future.result()
+                    self.deidentifier.reference_table.update(reference_table)
+                    self._save_deidentified(file_path, deidentified_content)
+                    processed_documents[file_path.name] = deidentified_content
         
         # Save the reference table
         ref_table_path = self.deidentifier.save_reference_table()
@@ -130,12 +169,12 @@ class DelilahPrime:
         
         # Check if API key is available
         if os.environ.get("CLAUDE_API_KEY"):
-            for section, content in organized_content.items():
-                if content:
-                    print(f"Enhancing section: {section}")
-                    enhanced_sections[section] = self.claude_api.generate_narrative(
-                        section, content
-                    )
+            sections_to_enhance = {
+                section: content for section, content in organized_content.items() if content
+            }
+            print(f"Enhancing sections: {', '.join(sections_to_enhance)}")
+            # Short sections are sent together to save round-trips
+            enhanced_sections = self.claude_api.generate_narratives_batched(sections_to_enhance)
         else:
             print("Warning: Claude API key not set. Skipping content enhancement.")
         
@@ -173,7 +212,7 @@ class DelilahPrime:
         # Save the re-identified report
         timestamp = Path(report_path).stem.replace("draft_", "")
         reidentified_path = self.output_path / f"final_report_{timestamp}.txt"
-        with open(reidentified_path, 'w', encoding='utf-8') as f:
+        with open(reidentified_path, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as f:
             f.write(reidentified_content)
         
         print(f"Final report generated at {reidentified_path}")
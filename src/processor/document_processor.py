@@ -7,20 +7,75 @@ This module handles the extraction and processing of content from different docu
 import os
 from pathlib import Path
 import re
-import json
+import hashlib
+import functools
+from collections import OrderedDict
 import math
+import bisect
+import itertools
+import threading
+import multiprocessing
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 from src.deidentifier.deidentifier import Deidentifier
 from src.api.claude_api import ClaudeAPIClient
+from src.config import load_config
 
-# Document format handlers
+# WordprocessingML tags read when streaming a .docx body
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_DOCX_P, _DOCX_R, _DOCX_T, _DOCX_TC, _DOCX_TR, _DOCX_TBL = (_W + tag for tag in ('p', 'r', 't', 'tc', 'tr', 'tbl'))
+_DOCX_RUN_BREAKS = {_W + 'tab': '\t', _W + 'br': '\n', _W + 'cr': '\n'}
+
+# PDF backends, fastest first: PyMuPDF's C parser, then pure-Python pypdf
 try:
-    import docx
-    from PyPDF2 import PdfReader
-    DOCX_SUPPORT = True
-    PDF_SUPPORT = True
+    import pymupdf
+    PDF_BACKEND = 'pymupdf'
 except ImportError:
-    DOCX_SUPPORT = False
-    PDF_SUPPORT = False
+    try:
+        from pypdf import PdfReader
+        PDF_BACKEND = 'pypdf'
+    except ImportError:
+        PDF_BACKEND = None
+PDF_SUPPORT = PDF_BACKEND is not None
+
+# Limits for a single PDF page, so one corrupt page can't hang or bloat extraction
+PDF_PAGE_TIMEOUT = 15  # seconds
+MAX_PDF_PAGE_CHARS = 500_000
+
+# Section extraction results are memoized per document; contents shorter than
+# this are cheaper to rescan than to hash
+SECTION_CACHE_SIZE = 128
+SECTION_CACHE_MIN_CHARS = 4096
+
+# Extracted, de-identified file contents kept per (path, mtime, size)
+FILE_CACHE_SIZE = 64
+
+# Multi-keyword matching for filename categorization
+try:
+    import ahocorasick
+    AHOCORASICK_SUPPORT = True
+except ImportError:
+    AHOCORASICK_SUPPORT = False
+
+# Filename terms for categorize_document; earlier categories win when several match
+FILENAME_CATEGORIES = (
+    ('assessment_notes', ('assessment', 'eval', 'notes', 'report', 'ot report', 'pt report')),
+    ('file_review', ('file', 'review', 'history', 'record', 'documentation')),
+    ('medical_documents', ('medical', 'health', 'clinical', 'hospital', 'discharge')),
+)
+
+
+def _build_category_automaton():
+    """Build an Aho-Corasick automaton mapping each filename term to its category's priority."""
+    automaton = ahocorasick.Automaton()
+    # Add lower-priority categories first so a shared term keeps the higher priority
+    for priority in reversed(range(len(FILENAME_CATEGORIES))):
+        for term in FILENAME_CATEGORIES[priority][1]:
+            automaton.add_word(term, priority)
+    automaton.make_automaton()
+    return automaton
 
 
 class DocumentProcessor:
@@ -37,8 +92,7 @@ class DocumentProcessor:
         if config_path is None:
             config_path = Path(__file__).parent.parent.parent / "config.json"
         
-        with open(config_path, 'r') as f:
-            config = json.load(f)
+        config = load_config(str(config_path))
         
         # Set up dependencies
         self.deidentifier = Deidentifier()
@@ -50,6 +104,27 @@ class DocumentProcessor:
         # List of available sections from the section keywords
         self.sections = list(self.section_keywords.keys())
         
+        # Keyword index for section extraction: every keyword maps to the
+        # sections listing it, and one case-insensitive alternation over all
+        # keywords skips lines that mention none of them
+        self._keyword_sections = {}
+        for section, keywords in self.section_keywords.items():
+            for keyword in keywords:
+                self._keyword_sections.setdefault(keyword, []).append(section)
+        self._any_keyword_pattern = re.compile('|'.join(map(re.escape, self._keyword_sections)), re.IGNORECASE)
+        if AHOCORASICK_SUPPORT:
+            self._keyword_ac = ahocorasick.Automaton()
+            for keyword in self._keyword_sections:
+                self._keyword_ac.add_word(keyword, keyword)
+            self._keyword_ac.make_automaton()
+        self._section_cache = OrderedDict()
+        self._file_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        
+        # Extraction worker processes, started on first use and reused
+        self._process_pool = None
+        self._process_pool_lock = threading.Lock()
+        
         # Document categorization patterns
         self.doc_categories = {
             'assessment_notes': [
@@ -64,14 +139,27 @@ class DocumentProcessor:
             'general': []  # Fallback category
         }
         
+        # Filename categorization matchers, built once for every categorize_document call
+        if AHOCORASICK_SUPPORT:
+            self._category_ac = _build_category_automaton()
+        else:
+            self._category_patterns = [
+                (category, re.compile('|'.join(map(re.escape, terms))))
+                for category, terms in FILENAME_CATEGORIES
+            ]
+        
         # Configure chunking parameters
         self.max_chunk_size = config.get('max_chunk_size', 2000)  # Reduced from 4000 to 2000 characters per chunk
         self.chunk_overlap = config.get('chunk_overlap', 250)  # Reduced overlap to preserve context but avoid duplication
     
-    def process_file(self, file_path):
+    @classmethod
+    def process_file(cls, file_path):
         """
         Process a file and extract its content based on file type.
         
+        Extraction needs no instance state, so this can also be called on the
+        class itself, e.g. from worker processes.
+        
         Args:
             file_path: Path to the file to process
             
@@ -82,11 +170,11 @@ class DocumentProcessor:
         extension = file_path.suffix.lower()
         
         if extension == '.txt' or extension == '.md':
-            return self._process_text_file(file_path)
-        elif extension == '.docx' and DOCX_SUPPORT:
-            return self._process_docx_file(file_path)
+            return cls._process_text_file(file_path)
+        elif extension == '.docx':
+            return cls._process_docx_file(file_path)
         elif extension == '.pdf' and PDF_SUPPORT:
-            return self._process_pdf_file(file_path)
+            return cls._process_pdf_file(file_path)
         else:
             raise ValueError(f"Unsupported file type: {extension}")
     
@@ -106,75 +194,189 @@ class DocumentProcessor:
         
         # Split text by paragraphs to maintain context
         paragraphs = text.split('\n')
-        chunks = []
-        current_chunk = []
-        current_length = 0
         
-        for paragraph in paragraphs:
-            # If adding this paragraph would exceed max size, finalize current chunk
-            if current_length + len(paragraph) > self.max_chunk_size and current_chunk:
-                chunks.append('\n'.join(current_chunk))
-                
-                # Start new chunk with overlap (keep some paragraphs from previous chunk)
-                overlap_size = 0
-                overlap_paragraphs = []
-                
-                # Add paragraphs from end of previous chunk until we reach desired overlap
-                for p in reversed(current_chunk):
-                    if overlap_size + len(p) <= self.chunk_overlap:
-                        overlap_paragraphs.insert(0, p)
-                        overlap_size += len(p) + 1  # +1 for newline
-                    else:
-                        break
-                
-                current_chunk = overlap_paragraphs
-                current_length = overlap_size
+        # offsets[k] is where paragraph k starts in text, so a chunk of
+        # paragraphs[s:e] is text[offsets[s]:offsets[e] - 1] and is sliced
+        # straight out of the source rather than re-joined
+        offsets = list(itertools.accumulate((len(p) + 1 for p in paragraphs), initial=0))
+        chunks = []
+        start = 0
+        # The paragraph that triggered the last split always joins the next chunk
+        last_split = 0
+        
+        while True:
+            # Finalize the chunk before the first paragraph that would push it past max size
+            end = bisect.bisect_right(offsets, offsets[start] + self.max_chunk_size + 1, lo=last_split + 2) - 1
+            if end >= len(paragraphs):
+                break
+            chunks.append(text[offsets[start]:offsets[end] - 1])
             
-            current_chunk.append(paragraph)
-            current_length += len(paragraph) + 1  # +1 for newline
+            # Start new chunk with overlap (keep trailing paragraphs from previous
+            # chunk that fit within the desired overlap)
+            start = max(start, bisect.bisect_left(offsets, offsets[end] - self.chunk_overlap - 1))
+            last_split = end
         
-        # Add the last chunk if not empty
-        if current_chunk:
-            chunks.append('\n'.join(current_chunk))
+        # Add the last chunk
+        chunks.append(text[offsets[start]:])
         
         return chunks
     
-    def _process_text_file(self, file_path):
+    @staticmethod
+    def _process_text_file(file_path):
         """Extract content from a text file."""
         with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
             return f.read()
     
-    def _process_docx_file(self, file_path):
-        """Extract content from a Word document."""
-        doc = docx.Document(file_path)
-        
-        # Extract text from paragraphs
-        paragraphs = [para.text for para in doc.paragraphs]
-        
-        # Extract text from tables
-        tables_text = []
-        for table in doc.tables:
-            for row in table.rows:
-                row_text = ' | '.join(cell.text for cell in row.cells if cell.text.strip())
-                if row_text:
-                    tables_text.append(row_text)
-        
-        # Combine paragraphs and tables
-        all_text = paragraphs + tables_text
-        return '\n'.join(all_text)
+    @staticmethod
+    def _process_docx_file(file_path):
+        """
+        Extract content from a Word document.
+        
+        The document body is streamed straight from word/document.xml rather
+        than built into a python-docx object tree. Paragraphs come out one per
+        line and table rows as ' | '-separated non-empty cells, in document order.
+        """
+        lines = []
+        paragraph_stack = []  # run texts of each open paragraph
+        cell_paragraphs = []
+        row_cells = []
+        table_depth = 0
+        # w:tab also defines tab stops under w:pPr/w:tabs; only tabs and
+        # breaks inside a run are text
+        run_depth = 0
+        
+        with zipfile.ZipFile(file_path) as archive, archive.open('word/document.xml') as f:
+            for event, elem in ET.iterparse(f, events=('start', 'end')):
+                tag = elem.tag
+                if event == 'start':
+                    if tag == _DOCX_P:
+                        paragraph_stack.append([])
+                    elif tag == _DOCX_R:
+                        run_depth += 1
+                    elif tag == _DOCX_TBL:
+                        table_depth += 1
+                    continue
+                
+                if tag == _DOCX_T:
+                    if paragraph_stack and elem.text:
+                        paragraph_stack[-1].append(elem.text)
+                elif tag == _DOCX_R:
+                    run_depth -= 1
+                elif tag in _DOCX_RUN_BREAKS:
+                    if paragraph_stack and run_depth:
+                        paragraph_stack[-1].append(_DOCX_RUN_BREAKS[tag])
+                elif tag == _DOCX_P:
+                    text = ''.join(paragraph_stack.pop())
+                    # Paragraphs nested in another (text boxes) and in nested tables are skipped
+                    if not paragraph_stack:
+                        if table_depth == 0:
+                            lines.append(text)
+                        elif table_depth == 1:
+                            cell_paragraphs.append(text)
+                    elem.clear()
+                elif table_depth == 1 and tag == _DOCX_TC:
+                    row_cells.append('\n'.join(cell_paragraphs))
+                    cell_paragraphs = []
+                elif table_depth == 1 and tag == _DOCX_TR:
+                    row_text = ' | '.join(cell for cell in row_cells if cell.strip())
+                    if row_text:
+                        lines.append(row_text)
+                    row_cells = []
+                elif tag == _DOCX_TBL:
+                    table_depth -= 1
+                    elem.clear()
+        
+        return '\n'.join(lines)
     
-    def _process_pdf_file(self, file_path):
+    @staticmethod
+    def _process_pdf_file(file_path):
         """Extract content from a PDF file."""
-        reader = PdfReader(file_path)
-        text_parts = []
+        # Join all pages with a separator
+        return '\n\n'.join(DocumentProcessor._iter_pdf_pages(file_path))
+    
+    @staticmethod
+    def _iter_pdf_pages(file_path, page_timeout=PDF_PAGE_TIMEOUT, max_page_chars=MAX_PDF_PAGE_CHARS):
+        """
+        Yield the text of each non-empty page of a PDF file, one page at a time.
         
-        for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text_parts.append(page_text)
+        Each page is extracted on a worker thread so a pathological page can be
+        abandoned after page_timeout seconds. The stuck extraction still holds
+        the document, so the rest of it is skipped. Pages longer than
+        max_page_chars are dropped.
         
-        # Join all pages with a separator
-        return '\n\n'.join(text_parts)
+        Args:
+            file_path: Path to the PDF file
+            page_timeout: Seconds to wait for a single page
+            max_page_chars: Largest page text to keep
+            
+        Returns:
+            Generator of page texts
+        """
+        if PDF_BACKEND == 'pymupdf':
+            doc = pymupdf.open(file_path)
+            page_count = doc.page_count
+            extract = lambda i: doc[i].get_text("text")
+        else:
+            doc = None
+            reader = PdfReader(file_path)
+            page_count = len(reader.pages)
+            extract = lambda i: reader.pages[i].extract_text()
+        
+        executor = ThreadPoolExecutor(max_workers=1)
+        timed_out = False
+        try:
+            for i in range(page_count):
+                try:
+                    page_text = executor.submit(extract, i).result(timeout=page_timeout)
+                except FutureTimeoutError:
+                    print(f"Page {i + 1} of {file_path} timed out after {page_timeout}s, skipping the rest of the document")
+                    timed_out = True
+                    return
+                
+                if not page_text:
+                    continue
+                if len(page_text) > max_page_chars:
+                    print(f"Page {i + 1} of {file_path} has {len(page_text)} characters, skipping it")
+                    continue
+                yield page_text
+        finally:
+            executor.shutdown(wait=False)
+            if doc is not None and not timed_out:
+                doc.close()
+    
+    def _get_process_pool(self):
+        """
+        Return the worker pool used to extract documents, starting it if needed.
+        
+        Workers come from a forkserver (spawn where that is unavailable) rather
+        than forking this process: in the web app other threads may be holding
+        locks, such as stdout's, that a forked child would inherit held.
+        
+        Returns:
+            ProcessPoolExecutor shared by every organize_content call
+        """
+        with self._process_pool_lock:
+            if self._process_pool is None:
+                start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=os.cpu_count() or 1,
+                    mp_context=multiprocessing.get_context(start_method)
+                )
+            return self._process_pool
+    
+    def _discard_process_pool(self, executor):
+        """Drop a broken worker pool so the next call starts a new one."""
+        with self._process_pool_lock:
+            if self._process_pool is executor:
+                self._process_pool = None
+        executor.shutdown(wait=False)
+    
+    def close(self):
+        """Shut down the extraction worker processes, if any were started."""
+        with self._process_pool_lock:
+            executor, self._process_pool = self._process_pool, None
+        if executor is not None:
+            executor.shutdown()
     
     def categorize_document(self, file_name):
         """
@@ -188,17 +390,15 @@ class DocumentProcessor:
         """
         file_name = file_name.lower()
         
-        # Check for assessment notes
-        if any(term in file_name for term in ['assessment', 'eval', 'notes', 'report', 'ot report', 'pt report']):
-            return 'assessment_notes'
-        # Check for file reviews
-        elif any(term in file_name for term in ['file', 'review', 'history', 'record', 'documentation']):
-            return 'file_review'
-        # Check for medical documents
-        elif any(term in file_name for term in ['medical', 'health', 'clinical', 'hospital', 'discharge']):
-            return 'medical_documents'
-        else:
-            return 'other'
+        if AHOCORASICK_SUPPORT:
+            # One scan finds every term; the highest-priority category wins
+            priority = min((priority for _, priority in self._category_ac.iter(file_name)), default=None)
+            return FILENAME_CATEGORIES[priority][0] if priority is not None else 'other'
+        
+        for category, pattern in self._category_patterns:
+            if pattern.search(file_name):
+                return category
+        return 'other'
     
     def organize_content(self, documents):
         """
@@ -210,11 +410,42 @@ class DocumentProcessor:
         Returns:
             Dictionary with section content
         """
-        organized_content = {section: "" for section in self.section_keywords.keys()}
+        # Collect each section's excerpts and join them once at the end
+        section_parts = {section: [] for section in self.section_keywords.keys()}
         
         # Convert list of file paths to dict of content if needed
         documents_dict = {}
-        if isinstance(documents, list):
+        if isinstance(documents, list) and len(documents) > 1:
+            # Same fan-out as the CLI's input directory; files unchanged since
+            # they were last extracted come from the cache instead
+            ref_table_path = str(self.deidentifier.ref_table_path)
+            cache_keys = [self._file_cache_key(file_path) for file_path in documents]
+            cached = [self._cache_get(self._file_cache, key) if key else None for key in cache_keys]
+            missing = [i for i, file_content in enumerate(cached) if file_content is None]
+            
+            executor = self._get_process_pool()
+            futures = {
+                i: executor.submit(deidentify_file, documents[i], ref_table_path)
+                for i in missing
+            }
+            for i, file_path in enumerate(documents):
+                try:
+                    if i in futures:
+                        file_content, reference_table = futures[i].result()
+                        self.deidentifier.reference_table.update(reference_table)
+                        if cache_keys[i]:
+                            self._cache_put(self._file_cache, cache_keys[i], file_content, FILE_CACHE_SIZE)
+                    else:
+                        file_content = cached[i]
+                    doc_name = os.path.basename(file_path)
+                    documents_dict[doc_name] = file_content
+                    print(f"Extracted content from {doc_name}")
+                except Exception as e:
+                    print(f"Error extracting content from {file_path}: {str(e)}")
+                    if isinstance(e, BrokenProcessPool):
+                        # A worker died; start fresh processes next time
+                        self._discard_process_pool(executor)
+        elif isinstance(documents, list):
             # Process each file to get content
             for file_path in documents:
                 try:
@@ -239,83 +470,144 @@ class DocumentProcessor:
             # Try to categorize the document type
             doc_type = self.categorize_document(doc_name)
             
-            # Process each section
-            for section_name, keywords in self.section_keywords.items():
-                # Extract content based on keywords
-                section_content = self._extract_section(content, keywords)
-                
+            # Extract every section from one scan of the document
+            for section_name, section_content in self._extract_sections(content).items():
                 # If we found content, add it to the organized content
                 if section_content:
-                    if organized_content[section_name]:
-                        organized_content[section_name] += f"\n\n--- From {doc_name} ---\n\n"
-                    else:
-                        organized_content[section_name] += f"--- From {doc_name} ---\n\n"
-                        
-                    organized_content[section_name] += section_content
+                    section_parts[section_name].append(f"--- From {doc_name} ---\n\n{section_content}")
                     
-        return organized_content
+        return {section: "\n\n".join(parts) for section, parts in section_parts.items()}
     
-    def _extract_section(self, content, keywords, context_lines=15):
+    def _extract_section(self, content, section_name, context_lines=15):
         """
         Extract a section of text based on keywords.
         
         Args:
             content: Text content to extract from
-            keywords: List of keywords that might indicate the section
+            section_name: Section whose keywords might indicate the section
             context_lines: Number of lines to include for context
             
         Returns:
             Extracted section text
         """
-        # Convert content to lowercase for case-insensitive matching
-        content_lower = content.lower()
-        lines = content.split('\n')
+        return self._extract_sections(content, (section_name,), context_lines)[section_name]
+    
+    def _extract_sections(self, content, sections=None, context_lines=15):
+        """
+        Extract several sections of text from a single scan of the content.
         
-        # First try to find section headers
-        for i, line in enumerate(lines):
-            line_lower = line.lower()
+        Args:
+            content: Text content to extract from
+            sections: Section names to extract, defaults to all sections
+            context_lines: Number of lines to include for context
             
-            # Check if line contains a section header with any of the keywords
-            if any(keyword in line_lower for keyword in keywords):
-                # Check if this looks like a header (short line, possibly with formatting)
-                if len(line.strip()) < 100 and (line.strip().endswith(':') or line.strip().startswith('#') or line.isupper()):
-                    start = max(0, i)
-                    
-                    # Look for the next section header or end of content
-                    end = len(lines)
-                    for j in range(i + 1, min(len(lines), i + 50)):
-                        next_line = lines[j].lower()
-                        # Check if this line looks like a new section header
-                        if (len(next_line.strip()) < 100 and 
-                            (next_line.strip().endswith(':') or next_line.strip().startswith('#') or next_line.isupper()) and
-                            any(kw in next_line for kw in sum(self.section_keywords.values(), []))):
-                            end = j
-                            break
-                    
-                    return '\n'.join(lines[start:end])
+        Returns:
+            Dictionary of section name to extracted text (empty if not found)
+        """
+        if sections is None:
+            sections = self.sections
+        
+        # Reuse the result for a document that was already organized
+        cache_key = None
+        if len(content) >= SECTION_CACHE_MIN_CHARS:
+            digest = hashlib.blake2b(content.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+            cache_key = (digest, tuple(sections), context_lines)
+            cached = self._cache_get(self._section_cache, cache_key)
+            if cached is not None:
+                return dict(cached)
         
-        # If no clear section headers, try to find paragraphs containing keywords
-        best_match = None
-        best_score = 0
+        lines = content.split('\n')
         
+        # Index the lines mentioning any keyword, with how many distinct
+        # keywords of each section they contain
+        line_hits = {}
         for i, line in enumerate(lines):
-            line_lower = line.lower()
-            
-            # Calculate a score based on how many keywords are found
-            score = sum(2 for keyword in keywords if keyword in line_lower)
-            
-            # Check surrounding lines for context
-            context_score = 0
-            for j in range(max(0, i-5), min(len(lines), i+5)):
-                if i != j:  # Skip the current line
-                    context_score += sum(1 for keyword in keywords if keyword in lines[j].lower())
+            if self._any_keyword_pattern.search(line):
+                counts = self._count_section_keywords(line.lower())
+                if counts:
+                    line_hits[i] = counts
+        hit_lines = list(line_hits)
+        
+        extracted = {
+            section: self._extract_section_from_hits(lines, line_hits, hit_lines, section, context_lines)
+            for section in sections
+        }
+        
+        if cache_key is not None:
+            self._cache_put(self._section_cache, cache_key, extracted, SECTION_CACHE_SIZE)
+            return dict(extracted)
+        return extracted
+    
+    def _count_section_keywords(self, line_lower):
+        """Count the distinct keywords of each section found in a lowercased line."""
+        counts = {}
+        if AHOCORASICK_SUPPORT:
+            for keyword in {keyword for _, keyword in self._keyword_ac.iter(line_lower)}:
+                for section in self._keyword_sections[keyword]:
+                    counts[section] = counts.get(section, 0) + 1
+        else:
+            for section, keywords in self.section_keywords.items():
+                hits = sum(1 for keyword in keywords if keyword in line_lower)
+                if hits:
+                    counts[section] = hits
+        return counts
+    
+    def _extract_section_from_hits(self, lines, line_hits, hit_lines, section_name, context_lines):
+        """
+        Extract one section using the keyword index built by _extract_sections.
+        
+        Args:
+            lines: Lines of the content
+            line_hits: Line number -> {section: distinct keyword count} for lines with keywords
+            hit_lines: Sorted line numbers of line_hits
+            section_name: Section to extract
+            context_lines: Number of lines to include for context
             
-            total_score = score + context_score
-            if total_score > best_score:
-                best_score = total_score
-                best_match = i
+        Returns:
+            Extracted section text
+        """
+        positions = [i for i in hit_lines if section_name in line_hits[i]]
+        
+        # First try to find section headers
+        for i in positions:
+            # Check if this looks like a header (short line, possibly with formatting)
+            line = lines[i]
+            stripped = line.strip()
+            if len(stripped) < 100 and (stripped.endswith(':') or stripped.startswith('#') or line.isupper()):
+                # Look for the next section header, within 50 lines, or end of content
+                end = len(lines)
+                for k in range(bisect.bisect_right(hit_lines, i), len(hit_lines)):
+                    j = hit_lines[k]
+                    if j >= i + 50:
+                        break
+                    next_line = lines[j].strip()
+                    if len(next_line) < 100 and (next_line.endswith(':') or next_line.startswith('#')):
+                        end = j
+                        break
+                
+                return '\n'.join(lines[i:end])
+        
+        if not positions:
+            return ""
         
-        if best_match is not None and best_score >= 2:
+        # If no clear section headers, try to find paragraphs containing keywords.
+        # Only lines within reach of a keyword line can score, and a running
+        # total over the keyword lines gives each one's +/-5 line context.
+        counts = [line_hits[i][section_name] for i in positions]
+        cumulative = list(itertools.accumulate(counts, initial=0))
+        
+        def hits_between(lo, hi):
+            return cumulative[bisect.bisect_left(positions, hi)] - cumulative[bisect.bisect_left(positions, lo)]
+        
+        def total_score(i):
+            # Two points per keyword on the line itself, one per keyword on
+            # each of the surrounding lines
+            return hits_between(i, i + 1) + hits_between(max(0, i - 5), min(len(lines), i + 5))
+        
+        candidates = sorted({i for h in positions for i in range(max(0, h - 4), min(len(lines), h + 6))})
+        best_match = max(candidates, key=total_score)
+        
+        if total_score(best_match) >= 2:
             start = max(0, best_match - 5)
             end = min(len(lines), best_match + context_lines)
             return '\n'.join(lines[start:end])
@@ -323,7 +615,7 @@ class DocumentProcessor:
         # If no section found, return empty string
         return ""
 
-    def process_documents(self, files, prompt_template=None, reference_table=None):
+    def process_documents(self, files, prompt_template=None, reference_table=None, organized_content=None):
         """
         Process multiple document files, enhancing the content if API is available.
         
@@ -331,6 +623,8 @@ class DocumentProcessor:
             files: List of file paths to process
             prompt_template: Custom prompt template to use for enhancement (optional)
             reference_table: Reference table for re-identification (optional)
+            organized_content: Result of organize_content(files) if the caller
+                already has it, so the files aren't extracted and de-identified again (optional)
             
         Returns:
             report_content: Dictionary with section content
@@ -339,7 +633,8 @@ class DocumentProcessor:
         print(f"Processing {len(files)} files")
         
         # Use the organize_content method which already exists
-        organized_content = self.organize_content(files)
+        if organized_content is None:
+            organized_content = self.organize_content(files)
         
         # Create a dictionary to store the final report content
         report_content = {}
@@ -355,27 +650,42 @@ class DocumentProcessor:
             
             # Add content to the report (will be enhanced if API available)
             report_content[section_name] = content
-            
-            # If the API is available, attempt enhancement
-            if self.api_client.is_available():
-                try:
-                    # If custom prompt is provided, use it
-                    if prompt_template:
-                        enhanced_content = self.api_client.generate_custom_narrative(
-                            section_name, content, prompt_template
-                        )
-                    else:
-                        # Use the default prompt
-                        enhanced_content = self.api_client.generate_narrative(
-                            section_name, content
-                        )
-                    
-                    # Only update if we got back valid content
+        
+        # With a custom prompt every section is its own request; they are
+        # network-bound, so send them concurrently and let the client's rate
+        # limiter space them out
+        if prompt_template and report_content and self.api_client.is_available():
+            max_workers = min(self.api_client.api_config.get("concurrency", 4), len(report_content))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    section_name: executor.submit(
+                        self.api_client.generate_custom_narrative, section_name, content, prompt_template
+                    )
+                    for section_name, content in report_content.items()
+                }
+                for section_name, future in futures.items():
+                    try:
+                        enhanced_content = future.result()
+                        
+                        # Only update if we got back valid content
+                        if enhanced_content and enhanced_content.strip():
+                            report_content[section_name] = enhanced_content
+                    except Exception as e:
+                        print(f"Error enhancing section {section_name}: {str(e)}")
+                        # Keep the original content on error
+        
+        # With the default prompt, short sections are enhanced together in batches
+        if not prompt_template and report_content and self.api_client.is_available():
+            try:
+                enhanced_sections = self.api_client.generate_narratives_batched(dict(report_content))
+                
+                # Only update sections where we got back valid content
+                for section_name, enhanced_content in enhanced_sections.items():
                     if enhanced_content and enhanced_content.strip():
                         report_content[section_name] = enhanced_content
-                except Exception as e:
-                    print(f"Error enhancing section {section_name}: {str(e)}")
-                    # Keep the original content on error
+            except Exception as e:
+                print(f"Error enhancing sections: {str(e)}")
+                # Keep the original content on error
                     
         print("== DOCUMENT PROCESSING COMPLETE ==")
         
@@ -398,24 +708,70 @@ class DocumentProcessor:
         Returns:
             De-identified content from the file
         """
+        # Reuse the content if the file hasn't changed since it was last extracted
+        cache_key = self._file_cache_key(file_path)
+        if cache_key:
+            cached = self._cache_get(self._file_cache, cache_key)
+            if cached is not None:
+                return cached
+        
+        content = self._read_file_content(file_path)
+        
+        # De-identify content
+        deidentified = self.deidentifier.deidentify_text(content) if content else ""
+        
+        if cache_key:
+            self._cache_put(self._file_cache, cache_key, deidentified, FILE_CACHE_SIZE)
+        return deidentified
+    
+    @staticmethod
+    def _file_cache_key(file_path):
+        """Return the (absolute path, mtime, size) cache key for a file, or None if it can't be read."""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    
+    def _cache_get(self, cache, key):
+        """Look up an LRU cache entry, marking it most recently used."""
+        with self._cache_lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+            return value
+    
+    def _cache_put(self, cache, key, value, max_size):
+        """Store an LRU cache entry, evicting the least recently used beyond max_size."""
+        with self._cache_lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            if len(cache) > max_size:
+                cache.popitem(last=False)
+    
+    @classmethod
+    def _read_file_content(cls, file_path):
+        """
+        Extract raw text content from a file based on its type.
+        
+        Args:
+            file_path: Path to the file
+            
+        Returns:
+            Text content of the file, or an empty string if the type is unsupported
+        """
         file_ext = os.path.splitext(file_path)[1].lower()
         
         # Extract content based on file type
-        if file_ext == '.txt':
-            content = self._process_text_file(file_path)
+        if file_ext in ('.txt', '.md'):
+            return cls._process_text_file(file_path)
         elif file_ext == '.docx':
-            content = self._process_docx_file(file_path)
+            return cls._process_docx_file(file_path)
         elif file_ext == '.pdf':
-            content = self._process_pdf_file(file_path)
+            return cls._process_pdf_file(file_path)
         else:
             print(f"Unsupported file type: {file_ext}")
             return ""
-            
-        # De-identify content
-        if content:
-            return self.deidentifier.deidentify_text(content)
-        
-        return ""
         
     def _organize_content_by_section(self, content, organized_content=None):
         """
@@ -435,11 +791,8 @@ class DocumentProcessor:
         if not content:
             return organized_content
             
-        # Process each section
-        for section_name, keywords in self.section_keywords.items():
-            # Extract content for this section based on keywords
-            section_content = self._extract_section(content, keywords)
-            
+        # Extract every section from one scan of the content
+        for section_name, section_content in self._extract_sections(content).items():
             # If we found content, add it to the organized content
             if section_content:
                 if organized_content[section_name]:
@@ -447,4 +800,32 @@ class DocumentProcessor:
                 else:
                     organized_content[section_name] = section_content
                     
-        return organized_content 
\ No newline at end of file
+        return organized_content 
+
+
+@functools.lru_cache(maxsize=8)
+def get_deidentifier(ref_table_path):
+    """Return a fully initialized Deidentifier for a reference table directory.
+    
+    Callers take a new_session() from it so each run keeps its own table.
+    """
+    return Deidentifier(ref_table_path=ref_table_path)
+
+
+def deidentify_file(file_path, ref_table_path):
+    """
+    Extract and de-identify one document; runs in a worker process.
+    
+    Args:
+        file_path: Path to the document
+        ref_table_path: Reference table directory, as a string
+        
+    Returns:
+        Tuple of (de-identified content, reference table for this document)
+    """
+    content = DocumentProcessor._read_file_content(file_path)
+    if not content:
+        return "", {}
+    
+    deidentifier = get_deidentifier(ref_table_path).new_session()
+    return deidentifier.deidentify_text(content), deidentifier.reference_table
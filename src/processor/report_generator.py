@@ -5,9 +5,18 @@ This module handles the assembly of the final clinical report from processed con
 """
 
 import os
+import re
+import functools
 from pathlib import Path
-import json
 from datetime import datetime
+from src.config import load_config
+
+
+@functools.lru_cache(maxsize=64)
+def _read_template(template_path, mtime_ns):
+    """Read a template file; the mtime in the key makes edits show up without a restart."""
+    with open(template_path, 'r', encoding='utf-8') as f:
+        return f.read()
 
 
 class ReportGenerator:
@@ -24,11 +33,13 @@ class ReportGenerator:
         if config_path is None:
             config_path = Path(__file__).parent.parent.parent / "config.json"
         
-        with open(config_path, 'r') as f:
-            config = json.load(f)
+        config = load_config(str(config_path))
         
         self.report_sections = config['report_sections']
         self.templates_dir = Path(__file__).parent.parent.parent / config["paths"]["templates_directory"]
+        
+        # Matches any {section} placeholder in a full report template
+        self._placeholder_re = re.compile(r"\{(" + "|".join(map(re.escape, self.report_sections)) + r")\}")
     
     def _load_template(self, template_name):
         """
@@ -42,12 +53,13 @@ class ReportGenerator:
         """
         template_path = self.templates_dir / f"{template_name}.txt"
         
-        if template_path.exists():
-            with open(template_path, 'r', encoding='utf-8') as f:
-                return f.read()
-        else:
+        try:
+            mtime_ns = os.stat(template_path).st_mtime_ns
+        except FileNotFoundError:
             # Return a default template if the file doesn't exist
             return f"# {template_name.replace('_', ' ').title()}\n\n{{content}}\n\n"
+        
+        return _read_template(str(template_path), mtime_ns)
     
     def _format_section_title(self, section_name):
         """Format a section name into a readable title."""
@@ -73,17 +85,15 @@ class ReportGenerator:
             
         # If we have a full report template, use it
         if template:
-            # Replace section placeholders in the template
-            report_content = template
-            for section in self.report_sections:
-                placeholder = f"{{{section}}}"
-                
-                # Use enhanced content if available, otherwise use original
-                content = enhanced_sections.get(section, "") or content_sections.get(section, "")
-                
-                # Replace the placeholder with content
-                report_content = report_content.replace(placeholder, content or "")
-                
+            # Use enhanced content if available, otherwise use original
+            contents = {
+                section: enhanced_sections.get(section, "") or content_sections.get(section, "") or ""
+                for section in self.report_sections
+            }
+            
+            # Replace every section placeholder in one pass over the template
+            report_content = self._placeholder_re.sub(lambda match: contents[match.group(1)], template)
+            
             return report_content
             
         # Otherwise build the report section by section